@@ -1,7 +1,33 @@
 from django.apps import AppConfig
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
 
 
 class ApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'api'
     verbose_name = 'API'
+
+    def ready(self):
+        from . import signals  # noqa: F401
+        self.check_caches()
+
+    def check_caches(self):
+        """
+        Версии данных и поколения ответов хранятся в кэше Django. Если
+        кэш в памяти процесса, изменение видит только воркер, который
+        его сделал, поэтому несколько воркеров требуют общего кэша.
+        """
+        from .cache import is_shared
+
+        if settings.GUNICORN_WORKERS <= 1:
+            return
+        for alias in settings.CACHES:
+            if not is_shared(alias):
+                raise ImproperlyConfigured(
+                    f'GUNICORN_WORKERS={settings.GUNICORN_WORKERS} '
+                    f'требует общего кэша, кэш {alias!r} хранится в '
+                    'памяти процесса. Задайте CACHE_BACKEND и '
+                    'RESPONSE_CACHE_BACKEND (например, FileBasedCache '
+                    'или memcached).'
+                )
@@ -0,0 +1,98 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from copy import copy
+
+from django.conf import settings
+from rest_framework.authentication import TokenAuthentication
+
+from foodgram.middleware import note
+
+from .cache import bump_generation, get_generation, is_shared
+
+
+class TokenCache:
+    """LRU кэш токенов в памяти процесса с ограниченным временем жизни."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def get(self, key, generation):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, entry_generation, expires_at = entry
+            if (entry_generation != generation
+                    or expires_at < time.monotonic()):
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, generation):
+        with self._lock:
+            self._entries[key] = (
+                value,
+                generation,
+                time.monotonic() + settings.TOKEN_CACHE_TTL
+            )
+            self._entries.move_to_end(key)
+            while len(self._entries) > settings.TOKEN_CACHE_SIZE:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+token_cache = TokenCache()
+
+
+def get_token_generation_key(key):
+    # В общем кэше хранится не сам токен, а его хэш.
+    return f'token-generation-{hashlib.sha256(key.encode()).hexdigest()}'
+
+
+def invalidate_tokens(*keys):
+    """
+    Сбрасывает кэш переданных токенов во всех процессах: записи
+    с прежним поколением больше не используются.
+    """
+    for key in keys:
+        bump_generation(
+            get_token_generation_key(key), timeout=settings.TOKEN_CACHE_TTL
+        )
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    TokenAuthentication, который кэширует пользователя по токену.
+
+    Записи живут не дольше TOKEN_CACHE_TTL секунд, их не больше
+    TOKEN_CACHE_SIZE. У каждого токена своё поколение в кэше Django,
+    оно читается до запроса к бд. Удаление токена (выход через djoser,
+    удаление пользователя), смена пароля и is_active увеличивают
+    поколения токенов пользователя (см. signals.py), и записи сразу
+    перестают действовать во всех процессах. Поэтому кэш включён только
+    с общим для процессов бэкендом (по умолчанию FileBasedCache, см.
+    CACHES), с LocMemCache токен читается из бд при каждом запросе.
+    """
+
+    def authenticate_credentials(self, key):
+        if not is_shared():
+            return super().authenticate_credentials(key)
+        generation = get_generation(
+            get_token_generation_key(key), timeout=settings.TOKEN_CACHE_TTL
+        )
+        entry = token_cache.get(key, generation)
+        if entry is None:
+            note('auth_cache', 'miss')
+            entry = super().authenticate_credentials(key)
+            token_cache.set(key, entry, generation)
+        else:
+            note('auth_cache', 'hit')
+        user, token = entry
+        return copy(user), token
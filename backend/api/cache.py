@@ -0,0 +1,261 @@
+import gzip
+import hashlib
+from functools import partial
+
+from django.conf import settings
+from django.core.cache import DEFAULT_CACHE_ALIAS, cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.cache import patch_vary_headers
+from django.utils.text import compress_sequence
+from rest_framework.renderers import JSONRenderer
+
+from foodgram.middleware import note
+from recipes.versions import bump_generation, get_data_version, get_generation
+
+RECIPES_GENERATION_KEY: str = 'recipes-generation'
+
+response_cache = caches['responses']
+
+
+def is_shared(alias=DEFAULT_CACHE_ALIAS):
+    """Кэш общий для всех процессов, а не в памяти одного процесса."""
+    return not isinstance(caches[alias], (LocMemCache, DummyCache))
+
+
+def get_recipe_generation_key(pk):
+    return f'recipe-generation-{pk}'
+
+
+def get_author_generation_key(pk):
+    return f'author-generation-{pk}'
+
+
+def get_recipe_author_key(pk):
+    return f'recipe-author-{pk}'
+
+
+def invalidate_recipes(*pks):
+    """
+    Сбрасывает кэш списка рецептов и ответов с переданными рецептами.
+    """
+    bump_generation(RECIPES_GENERATION_KEY, response_cache)
+    for pk in pks:
+        bump_generation(get_recipe_generation_key(pk), response_cache)
+
+
+def invalidate_author(pk):
+    """
+    Сбрасывает кэш списка рецептов и ответов с рецептами автора pk.
+    """
+    bump_generation(RECIPES_GENERATION_KEY, response_cache)
+    bump_generation(get_author_generation_key(pk), response_cache)
+
+
+class ReferenceDataCacheMixin:
+    """
+    Условное кэширование ответов со справочными данными.
+
+    Ответ помечается сильным ETag, который зависит от версии данных и
+    параметров запроса, поэтому If-None-Match проверяется без обращения
+    к бд. Сериализованное и сжатое gzip тело хранится в кэше Django.
+    Потоковые ответы (см. streaming.py) сжимаются на лету и попадают
+    в кэш после отправки, если тело не больше
+    REFERENCE_DATA_CACHE_MAX_SIZE, следующие запросы получают его из
+    кэша без обращения к бд.
+    """
+
+    def list(self, request, *args, **kwargs):
+        return self.get_cached_response(
+            super().list, request, *args, **kwargs
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.get_cached_response(
+            super().retrieve, request, *args, **kwargs
+        )
+
+    def get_cache_key(self, request):
+        query = sorted(
+            (key, value)
+            for key, values in request.query_params.lists()
+            for value in values
+        )
+        digest = hashlib.md5(
+            f'{request.path}?{query}'.encode()
+        ).hexdigest()
+        return f'{get_data_version()}-{digest}'
+
+    def get_cached_response(self, handler, request, *args, **kwargs):
+        if not isinstance(request.accepted_renderer, JSONRenderer):
+            return handler(request, *args, **kwargs)
+
+        key = self.get_cache_key(request)
+        use_gzip = 'gzip' in request.META.get('HTTP_ACCEPT_ENCODING', '')
+        etag = f'"{key}-gzip"' if use_gzip else f'"{key}"'
+        if etag in request.META.get('HTTP_IF_NONE_MATCH', ''):
+            response = HttpResponseNotModified()
+            return self.add_cache_headers(response, etag)
+
+        entry = cache.get(key)
+        if entry is None:
+            response = handler(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+            if response.streaming:
+                response.streaming_content = self.cache_stream(
+                    key, response.streaming_content
+                )
+                if use_gzip:
+                    response.streaming_content = compress_sequence(
+                        response.streaming_content
+                    )
+                    response['Content-Encoding'] = 'gzip'
+                return self.add_cache_headers(response, etag)
+            body = request.accepted_renderer.render(
+                response.data,
+                request.accepted_media_type,
+                self.get_renderer_context()
+            )
+            entry = (body, gzip.compress(body))
+            cache.set(key, entry, settings.REFERENCE_DATA_CACHE_TIMEOUT)
+
+        body, compressed_body = entry
+        response = HttpResponse(
+            compressed_body if use_gzip else body,
+            content_type=request.accepted_media_type
+        )
+        if use_gzip:
+            response['Content-Encoding'] = 'gzip'
+        return self.add_cache_headers(response, etag)
+
+    def cache_stream(self, key, content):
+        chunks = []
+        size = 0
+        for chunk in content:
+            if chunks is not None:
+                size += len(chunk)
+                if size > settings.REFERENCE_DATA_CACHE_MAX_SIZE:
+                    chunks = None
+                else:
+                    chunks.append(chunk)
+            yield chunk
+        if chunks is not None:
+            body = b''.join(chunks)
+            cache.set(
+                key,
+                (body, gzip.compress(body)),
+                settings.REFERENCE_DATA_CACHE_TIMEOUT
+            )
+
+    def add_cache_headers(self, response, etag):
+        response['ETag'] = etag
+        response['Cache-Control'] = (
+            f'public, max-age={settings.REFERENCE_DATA_MAX_AGE}'
+        )
+        patch_vary_headers(response, ('Accept', 'Accept-Encoding'))
+        return response
+
+
+class AnonymousResponseCacheMixin:
+    """
+    Кэш ответов list и retrieve для анонимных пользователей.
+
+    Ключ состоит из адреса сайта, версии справочных данных, поколений
+    рецептов и нормализованных параметров запроса, неизвестные параметры
+    в ключ не входят. Для списка берётся общее поколение, для рецепта -
+    своё и поколение его автора. Автор рецепта не меняется, поэтому
+    после первого ответа запоминается в кэше, а до этого ответ
+    не сохраняется: поколение автора должно быть прочитано до запроса
+    к бд. Поколения увеличиваются сигналами (см. signals.py), поэтому
+    устаревшие ответы не удаляются, а перестают запрашиваться.
+    Попадание в кэш отмечается в метриках запроса как response_cache.
+    """
+
+    response_cache_params = ('ordering', 'page', 'limit', 'cursor', 'count')
+
+    def list(self, request, *args, **kwargs):
+        return self.get_anonymous_response(
+            super().list,
+            (RECIPES_GENERATION_KEY,),
+            request, *args, **kwargs
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        pk = kwargs[self.lookup_url_kwarg or self.lookup_field]
+        author_key = get_recipe_author_key(pk)
+        author_id = response_cache.get(author_key)
+        if author_id is None:
+            handler = partial(self.retrieve_author, author_key)
+            generation_keys = None
+        else:
+            handler = super().retrieve
+            generation_keys = (
+                get_recipe_generation_key(pk),
+                get_author_generation_key(author_id),
+            )
+        return self.get_anonymous_response(
+            handler, generation_keys, request, *args, **kwargs
+        )
+
+    def retrieve_author(self, author_key, request, *args, **kwargs):
+        response = super().retrieve(request, *args, **kwargs)
+        if response.status_code == 200:
+            response_cache.set(
+                author_key, response.data['author']['id'], timeout=None
+            )
+        return response
+
+    def get_response_cache_key(self, request, generation_keys):
+        allowed = set(self.response_cache_params)
+        if self.filterset_class is not None:
+            allowed.update(self.filterset_class.base_filters)
+        query = sorted(
+            (key, value)
+            for key, values in request.query_params.lists()
+            if key in allowed
+            for value in values
+        )
+        # В теле абсолютные ссылки на изображения.
+        digest = hashlib.md5(
+            f'{request.scheme}://{request.get_host()}{request.path}?{query}'
+            .encode()
+        ).hexdigest()
+        generations = '-'.join(
+            str(get_generation(key, response_cache))
+            for key in generation_keys
+        )
+        return f'response-{get_data_version()}-{generations}-{digest}'
+
+    def get_anonymous_response(self, handler, generation_keys, request,
+                               *args, **kwargs):
+        """
+        Ответ из кэша, generation_keys=None - ответ не сохраняется.
+        """
+        if (request.user.is_authenticated
+                or not isinstance(request.accepted_renderer, JSONRenderer)):
+            return handler(request, *args, **kwargs)
+
+        key = None
+        body = None
+        if generation_keys is not None:
+            key = self.get_response_cache_key(request, generation_keys)
+            body = response_cache.get(key)
+        if body is None:
+            note('response_cache', 'miss')
+            response = handler(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+            body = request.accepted_renderer.render(
+                response.data,
+                request.accepted_media_type,
+                self.get_renderer_context()
+            )
+            if key is not None:
+                response_cache.set(
+                    key, body, settings.RESPONSE_CACHE_TIMEOUT
+                )
+        else:
+            note('response_cache', 'hit')
+        return HttpResponse(body, content_type=request.accepted_media_type)
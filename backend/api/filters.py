@@ -1,6 +1,9 @@
+from django.db.models import Exists, OuterRef
 from django_filters import rest_framework as filters
 
-from recipes.models import Ingredient, Recipe, Tag
+from recipes.models import (Favorite, Ingredient, Recipe, RecipeTag,
+                            ShoppingCart, Tag)
+from recipes.search import search_recipes
 
 
 class IngredientFilter(filters.FilterSet):
@@ -12,30 +15,65 @@ class IngredientFilter(filters.FilterSet):
 
 
 class RecipeFilter(filters.FilterSet):
+    """
+    Фильтры рецептов. Связи проверяются подзапросами, а не JOIN,
+    поэтому рецепты в выдаче не дублируются. Теги - подзапросом IN,
+    который читает индекс RecipeTag (tag, recipe), избранное и корзина -
+    EXISTS по индексу (user, recipe).
+
+    tags_mode=any (по умолчанию) - рецепты хотя бы с одним из тегов,
+    tags_mode=all - рецепты со всеми указанными тегами.
+    """
+    TAGS_MODE_CHOICES = (('any', 'any'), ('all', 'all'))
+
     author = filters.NumberFilter(field_name='author__id')
     tags = filters.ModelMultipleChoiceFilter(
-        field_name='tags__slug',
         to_field_name='slug',
         queryset=Tag.objects.all(),
+        method='filter_tags'
+    )
+    tags_mode = filters.ChoiceFilter(
+        choices=TAGS_MODE_CHOICES,
+        method='filter_tags_mode'
     )
     is_favorited = filters.BooleanFilter(method='filter_is_favorited')
     is_in_shopping_cart = filters.BooleanFilter(
         method='filter_in_shopping_cart'
     )
+    search = filters.CharFilter(method='filter_search')
 
-    def filter_by_tags(self, queryset, name, value):
-        return queryset.filter(tags__slug=value)
+    def filter_tags(self, queryset, name, value):
+        if not value:
+            return queryset
+        recipe_tags = RecipeTag.objects.values('recipe')
+        if self.form.cleaned_data.get('tags_mode') == 'all':
+            for tag in value:
+                queryset = queryset.filter(pk__in=recipe_tags.filter(tag=tag))
+            return queryset
+        return queryset.filter(pk__in=recipe_tags.filter(tag__in=value))
+
+    def filter_tags_mode(self, queryset, name, value):
+        return queryset
+
+    def filter_by_user(self, queryset, model, value):
+        exists = Exists(model.objects.filter(
+            user=self.request.user.id,
+            recipe=OuterRef('pk')
+        ))
+        return queryset.filter(exists if value else ~exists)
 
     def filter_is_favorited(self, queryset, name, value):
-        if value:
-            return queryset.filter(favorite__user=self.request.user.id)
-        return queryset.filter(favorite__user__date=self.request.user.id)
+        return self.filter_by_user(queryset, Favorite, value)
 
     def filter_in_shopping_cart(self, queryset, name, value):
-        if value:
-            return queryset.filter(shoppingcart__user=self.request.user.id)
-        return queryset.filter(shoppingcart__date=self.request.user.id)
+        return self.filter_by_user(queryset, ShoppingCart, value)
+
+    def filter_search(self, queryset, name, value):
+        return search_recipes(queryset, value)
 
     class Meta:
         model = Recipe
-        fields = ['author', 'tags', 'is_favorited', 'is_in_shopping_cart']
+        fields = [
+            'author', 'tags', 'tags_mode', 'is_favorited',
+            'is_in_shopping_cart', 'search'
+        ]
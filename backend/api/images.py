@@ -0,0 +1,117 @@
+import base64
+import binascii
+import re
+
+from django.conf import settings
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from django.core.files.uploadhandler import FileUploadHandler
+from django.http.multipartparser import MultiPartParserError
+from PIL import Image, ImageFile
+from rest_framework.exceptions import ValidationError
+
+BASE64_CHUNK_SIZE: int = 64 * 1024
+
+NOT_BASE64 = re.compile(r'[^A-Za-z0-9+/=]')
+
+
+def get_size_error():
+    return (
+        'Размер изображения не должен превышать '
+        f'{settings.RECIPE_IMAGE_MAX_SIZE} байт.'
+    )
+
+
+def check_dimensions(width, height):
+    max_dimension = settings.RECIPE_IMAGE_MAX_DIMENSION
+    if width > max_dimension or height > max_dimension:
+        raise ValidationError(
+            f'Ширина и высота изображения не должны превышать '
+            f'{max_dimension} пикселей.'
+        )
+
+
+def decode_base64_image(data):
+    """
+    Декодирует изображение в формате data:image/<ext>;base64,<data>
+    во временный файл на диске.
+
+    Размер проверяется до декодирования, размеры в пикселях - по
+    заголовку изображения, как только он декодирован. Строка
+    декодируется частями, поэтому полная копия изображения в памяти
+    не создаётся. Как и base64.b64decode, переводы строк и другие
+    символы не из алфавита base64 пропускаются, остаток части, не
+    кратный четырём символам, переносится в следующую.
+    """
+    header_end = data.find(';base64,')
+    if header_end == -1:
+        raise ValidationError('Загрузите корректное изображение.')
+    ext = data[:header_end].split('/')[-1]
+    start = header_end + len(';base64,')
+    length = len(data) - start - sum(
+        data.count(space, start) for space in ('\n', '\r', ' ')
+    )
+    size = length * 3 // 4 - data.rstrip()[-2:].count('=')
+    if size > settings.RECIPE_IMAGE_MAX_SIZE:
+        raise ValidationError(get_size_error())
+
+    file = TemporaryUploadedFile('temp.' + ext, f'image/{ext}', size, None)
+    parser = ImageFile.Parser()
+    rest = ''
+    try:
+        for offset in range(start, len(data) + 1, BASE64_CHUNK_SIZE):
+            encoded = rest + NOT_BASE64.sub(
+                '', data[offset:offset + BASE64_CHUNK_SIZE]
+            )
+            if offset + BASE64_CHUNK_SIZE < len(data):
+                aligned = len(encoded) - len(encoded) % 4
+                encoded, rest = encoded[:aligned], encoded[aligned:]
+            chunk = base64.b64decode(encoded)
+            if parser.image is None:
+                parser.feed(chunk)
+                if parser.image is not None:
+                    check_dimensions(*parser.image.size)
+            file.write(chunk)
+            if file.tell() > settings.RECIPE_IMAGE_MAX_SIZE:
+                raise ValidationError(get_size_error())
+    except (binascii.Error, OSError):
+        file.close()
+        raise ValidationError('Загрузите корректное изображение.')
+    except ValidationError:
+        file.close()
+        raise
+    file.size = file.tell()
+    file.seek(0)
+    return file
+
+
+def check_uploaded_image(file):
+    """Проверка размера изображения, загруженного как multipart файл."""
+    if file.size > settings.RECIPE_IMAGE_MAX_SIZE:
+        raise ValidationError(get_size_error())
+    try:
+        with Image.open(file) as image:
+            check_dimensions(*image.size)
+    except OSError:
+        raise ValidationError('Загрузите корректное изображение.')
+    finally:
+        file.seek(0)
+
+
+class ImageSizeUploadHandler(FileUploadHandler):
+    """
+    Прерывает разбор multipart запроса, как только загружаемый файл
+    превышает RECIPE_IMAGE_MAX_SIZE, не дожидаясь конца загрузки.
+    """
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.received = 0
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if self.received > settings.RECIPE_IMAGE_MAX_SIZE:
+            raise MultiPartParserError(get_size_error())
+        return raw_data
+
+    def file_complete(self, file_size):
+        return None
@@ -1,6 +1,102 @@
-from rest_framework.pagination import PageNumberPagination
+import json
+
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+
+PAGE_SIZE: int = 6
+MAX_PAGE_SIZE: int = 100
+EXACT_COUNT_THRESHOLD: int = 10000
+
+
+def estimate_count(queryset):
+    """
+    Оценка числа строк по статистике планировщика Postgres.
+    Для других бд возвращает None.
+    """
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return None
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return plan[0]['Plan']['Plan Rows']
+
+
+class ApproximateCountPaginator(Paginator):
+    """
+    Paginator, который не выполняет COUNT(*) для больших выборок,
+    а берёт оценку из плана запроса.
+    """
+
+    @cached_property
+    def count(self):
+        estimate = estimate_count(self.object_list)
+        if estimate is None or estimate < EXACT_COUNT_THRESHOLD:
+            return super().count
+        return estimate
+
+
+class KeysetPagination(CursorPagination):
+    """Постраничный вывод по курсору, ключ - id в обратном порядке."""
+
+    ordering = '-id'
+    page_size = PAGE_SIZE
+    page_size_query_param = 'limit'
+    max_page_size = MAX_PAGE_SIZE
+
+    @staticmethod
+    def is_keyed(queryset):
+        """
+        Выборка упорядочена только по id, как курсор. Другую сортировку,
+        например по релевантности поиска, курсор бы заменил.
+        """
+        return all(
+            str(field).lstrip('-') in ('id', 'pk')
+            for field in queryset.query.order_by
+        )
 
 
 class CustomPagination(PageNumberPagination):
+    """
+    Постраничный вывод по номеру страницы.
+
+    С параметром cursor (для первой страницы пустым) переключается на
+    KeysetPagination, если выборка упорядочена по id, иначе (например,
+    при поиске по релевантности) отвечает 400. С параметром
+    count=approximate для больших выборок отдаёт примерное количество
+    объектов вместо точного.
+    """
+
     page_size_query_param = "limit"
-    page_size = 6
+    page_size = PAGE_SIZE
+    max_page_size = MAX_PAGE_SIZE
+    cursor_query_param = 'cursor'
+    count_query_param = 'count'
+
+    keyset_pagination = None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.cursor_query_param in request.query_params:
+            if not KeysetPagination.is_keyed(queryset):
+                raise ValidationError({self.cursor_query_param: [
+                    'Курсор не сочетается с сортировкой по релевантности, '
+                    'используйте page или ordering=-id.'
+                ]})
+            self.keyset_pagination = KeysetPagination()
+            return self.keyset_pagination.paginate_queryset(
+                queryset, request, view
+            )
+        if request.query_params.get(self.count_query_param) == 'approximate':
+            self.django_paginator_class = ApproximateCountPaginator
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.keyset_pagination is not None:
+            return self.keyset_pagination.get_paginated_response(data)
+        return super().get_paginated_response(data)
@@ -0,0 +1,158 @@
+import multiprocessing
+import os
+import pickle
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from functools import lru_cache
+
+from django.conf import settings
+from fpdf import FPDF
+from rest_framework.exceptions import APIException
+
+FONT_FAMILY: str = 'GeistMono'
+FONT_PATH: str = os.path.join(
+    settings.BASE_DIR, 'static', 'font', 'GeistMono-Medium.ttf'
+)
+FONT_METRICS_PATH: str = os.path.splitext(FONT_PATH)[0] + '.pkl'
+FONT_SIZE: int = 25
+LINE_HEIGHT: int = 10
+
+
+@lru_cache(maxsize=None)
+def get_font_metrics():
+    """
+    Метрики шрифта GeistMono, загружаются из .pkl кэша один раз на процесс.
+    """
+    with open(FONT_METRICS_PATH, 'rb') as file:
+        metrics = pickle.load(file)
+    metrics['ttffile'] = FONT_PATH
+    return metrics
+
+
+class ShoppingListPDF(FPDF):
+    """Pdf-документ списка покупок с постраничной нумерацией."""
+
+    heading = 'Корзина покупок:'
+
+    def __init__(self):
+        super().__init__()
+        self.alias_nb_pages()
+        self.add_cached_font()
+        self.set_auto_page_break(True, margin=2 * LINE_HEIGHT)
+
+    def add_cached_font(self):
+        """
+        Аналог FPDF.add_font(uni=True) без повторного чтения метрик с диска.
+        """
+        metrics = get_font_metrics()
+        fontkey = FONT_FAMILY.lower()
+        self.fonts[fontkey] = {
+            'i': len(self.fonts) + 1,
+            'type': metrics['type'],
+            'name': metrics['name'],
+            'desc': metrics['desc'],
+            'up': metrics['up'],
+            'ut': metrics['ut'],
+            'cw': metrics['cw'],
+            'ttffile': metrics['ttffile'],
+            'fontkey': fontkey,
+            'subset': list(range(0, 57)),
+            'unifilename': FONT_METRICS_PATH,
+        }
+        self.font_files[fontkey] = {
+            'length1': metrics['originalsize'],
+            'type': 'TTF',
+            'ttffile': metrics['ttffile'],
+        }
+        self.font_files[FONT_PATH] = {'type': 'TTF'}
+
+    def footer(self):
+        self.set_y(-LINE_HEIGHT * 1.5)
+        self.cell(0, LINE_HEIGHT, txt=f'{self.page_no()}/{{nb}}', align='C')
+
+    def render(self, ingredients):
+        """Возвращает pdf со списком ингредиентов в виде байтов."""
+        self.add_page()
+        self.set_font(FONT_FAMILY, size=FONT_SIZE)
+        self.cell(0, LINE_HEIGHT, txt=self.heading, ln=True, align='C')
+        for ingredient in ingredients:
+            text = (
+                f"{ingredient['ingredient__name']}"
+                f"({ingredient['ingredient__measurement_unit']}): "
+                f"{ingredient['total_amount']}"
+            )
+            self.cell(0, LINE_HEIGHT, txt=text, ln=True, align='C')
+        return self.output(dest='S').encode('latin-1')
+
+
+def render_shopping_list(ingredients):
+    return ShoppingListPDF().render(ingredients)
+
+
+class RenderUnavailable(APIException):
+    status_code = 503
+    default_detail = (
+        'Список покупок сейчас не удалось сформировать, '
+        'повторите запрос позже.'
+    )
+    default_code = 'render_unavailable'
+
+
+class RenderPool:
+    """
+    Пул процессов для отрисовки pdf, создаётся при первом обращении.
+    Процессы запускаются через spawn: при SERVER_MODE=asgi процесс
+    сервера многопоточный, и fork скопировал бы блокировки, занятые
+    другими потоками.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._executor = None
+
+    def get(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=settings.PDF_RENDER_WORKERS,
+                    mp_context=multiprocessing.get_context('spawn')
+                )
+            return self._executor
+
+    def reset(self, broken):
+        """Сломанный пул (упал рабочий процесс) заменяется новым."""
+        with self._lock:
+            if self._executor is broken:
+                self._executor = None
+        broken.shutdown(wait=False)
+
+
+render_pool = RenderPool()
+
+
+def render_shopping_list_in_pool(ingredients):
+    """
+    Отрисовка списка покупок в отдельном процессе: рабочий процесс
+    сервера не занят вычислениями, одновременно рисуется не больше
+    PDF_RENDER_WORKERS документов. При PDF_RENDER_WORKERS=0 (по
+    умолчанию при SERVER_MODE=wsgi) список рисуется в текущем процессе.
+
+    Сломанный пул пересоздаётся и отрисовка повторяется один раз. Если
+    документ не готов за PDF_RENDER_TIMEOUT секунд, ещё не начатая
+    задача отменяется и возвращается 503, начатая дорисуется в пуле.
+    """
+    ingredients = list(ingredients)
+    if not settings.PDF_RENDER_WORKERS:
+        return render_shopping_list(ingredients)
+    for _ in range(2):
+        pool = render_pool.get()
+        try:
+            future = pool.submit(render_shopping_list, ingredients)
+            return future.result(timeout=settings.PDF_RENDER_TIMEOUT)
+        except BrokenProcessPool:
+            render_pool.reset(pool)
+        except TimeoutError:
+            future.cancel()
+            raise RenderUnavailable()
+    raise RenderUnavailable()
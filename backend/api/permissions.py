@@ -53,7 +53,7 @@ class IsAuthorOrAdminOrReadOnly(BasePermission):
                 or request.user.is_authenticated)
 
     def has_object_permission(self, request, view, obj):
-        return (((request.method == 'POST'
-                  or obj.author == request.user or request.user.is_staff)
-                 and request.user.is_authenticated)
-                or request.method in SAFE_METHODS)
+        return (request.method in SAFE_METHODS
+                or ((request.method == 'POST'
+                     or obj.author == request.user or request.user.is_staff)
+                    and request.user.is_authenticated))
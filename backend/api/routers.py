@@ -0,0 +1,69 @@
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+from django.urls import URLPattern
+from rest_framework import routers
+
+READ_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+def async_read_view(view):
+    """
+    Асинхронная обёртка view из ViewSet.
+
+    Запросы на чтение выполняются в пуле потоков (thread_sensitive=False),
+    а не в общем для всех синхронных view потоке, поэтому медленный запрос
+    не задерживает остальные. Соединения с бд в потоках пула закрываются
+    после каждого запроса. Остальные запросы выполняются как обычные
+    синхронные view.
+    """
+
+    def run(request, *args, **kwargs):
+        close_old_connections()
+        try:
+            response = view(request, *args, **kwargs)
+            if hasattr(response, 'render') and callable(response.render):
+                response.render()
+            return response
+        finally:
+            close_old_connections()
+
+    read = sync_to_async(run, thread_sensitive=False)
+    write = sync_to_async(view, thread_sensitive=True)
+
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        if request.method in READ_METHODS:
+            return await read(request, *args, **kwargs)
+        return await write(request, *args, **kwargs)
+
+    return wrapper
+
+
+class AsyncReadRouter(routers.DefaultRouter):
+    """
+    Router, который при SERVER_MODE=asgi делает асинхронными view
+    действий из async_read_actions ViewSet.
+    """
+
+    def get_urls(self):
+        urls = super().get_urls()
+        if settings.SERVER_MODE != 'asgi':
+            return urls
+        return [self.wrap_url(url) for url in urls]
+
+    def wrap_url(self, url):
+        view = url.callback
+        viewset = getattr(view, 'cls', None)
+        actions = getattr(view, 'actions', None) or {}
+        async_actions = getattr(viewset, 'async_read_actions', ())
+        if actions.get('get') not in async_actions:
+            return url
+        return URLPattern(
+            url.pattern,
+            async_read_view(view),
+            url.default_args,
+            url.name
+        )
@@ -1,20 +1,32 @@
-import base64
 import re
 
-from django.core.files.base import ContentFile
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
 from django.core.validators import MinValueValidator
 from django.db import transaction
 from django.db.models import F
 from djoser.serializers import UserCreateSerializer, UserSerializer
 from rest_framework import serializers
-from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.exceptions import ValidationError
 
+from foodgram.middleware import measure
+from recipes.feed import fan_out
 from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
-                            ShoppingCart, Tag)
+                            RecipeTag, ShoppingCart, Tag)
 from users.models import Subscribers, User
 
+from .images import check_uploaded_image, decode_base64_image
 
-class CustomUserSerializer(UserSerializer):
+
+class TimedSerializerMixin:
+    """Учитывает время сериализации в заголовке Server-Timing."""
+
+    def to_representation(self, instance):
+        with measure('serializer'):
+            return super().to_representation(instance)
+
+
+class CustomUserSerializer(TimedSerializerMixin, UserSerializer):
     is_subscribed = serializers.SerializerMethodField()
 
     class Meta(UserSerializer.Meta):
@@ -29,6 +41,8 @@ class CustomUserSerializer(UserSerializer):
         ]
 
     def get_is_subscribed(self, obj):
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
         request = self.context.get('request')
         if request and request.user.is_authenticated:
             return Subscribers.objects.filter(
@@ -82,7 +96,7 @@ class CustomUserCreateSerializer(UserCreateSerializer):
 
 class SubscriptionSerializer(CustomUserSerializer):
     recipes = serializers.SerializerMethodField()
-    recipes_count = serializers.SerializerMethodField()
+    recipes_count = serializers.IntegerField(read_only=True)
 
     class Meta(CustomUserSerializer.Meta):
         fields = CustomUserSerializer.Meta.fields + [
@@ -91,54 +105,27 @@ class SubscriptionSerializer(CustomUserSerializer):
         read_only_fields = CustomUserSerializer.Meta.fields
 
     def get_recipes(self, obj):
+        if hasattr(obj, 'limited_recipes'):
+            return RecipeCompactSerializer(
+                obj.limited_recipes, many=True
+            ).data
         limit = self.context.get('limit')
         recipes = obj.recipes.all()
         if limit:
             recipes = recipes[:int(limit)]
         return RecipeCompactSerializer(recipes, many=True).data
 
-    def get_recipes_count(self, obj):
-        return Recipe.objects.filter(author=obj).count()
-
-
-class SubscriptionCreateSerializer(serializers.ModelSerializer):
-    class Meta:
-        model = Subscribers
-        fields = ['user', 'author']
-
-    def validate(self, attrs):
-
-        user = attrs['user']
-        author = attrs['author']
-
-        if not User.objects.filter(id=author.id).exists():
-            raise NotFound({'author': 'Автор не найден.'})
-        if user == author:
-            raise ValidationError({'author': 'Нельзя подписаться на себя.'})
-        if user.subscribers.filter(author=author).exists():
-            raise ValidationError(
-                {'author': 'Вы уже подписаны на этого автора.'}
-            )
-
-        return attrs
-
-    def to_representation(self, instance):
-        return SubscriptionSerializer(
-            instance.author,
-            context=self.context
-        ).data
-
 
 ###########################################################
 
 
-class TagSerializer(serializers.ModelSerializer):
+class TagSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Tag
         fields = '__all__'
 
 
-class IngredientSerializer(serializers.ModelSerializer):
+class IngredientSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Ingredient
         fields = '__all__'
@@ -181,17 +168,20 @@ class RecipeGetIngredientSerializer(serializers.ModelSerializer):
 
 
 class Base64ImageField(serializers.ImageField):
+    """
+    Изображение в виде base64 строки или файла из multipart/form-data.
+    """
+
     def to_internal_value(self, data):
         if isinstance(data, str) and data.startswith('data:image'):
-            format, imgstr = data.split(';base64,')
-            ext = format.split('/')[-1]
-
-            data = ContentFile(base64.b64decode(imgstr), name='temp.' + ext)
+            data = decode_base64_image(data)
+        elif isinstance(data, UploadedFile):
+            check_uploaded_image(data)
 
         return super().to_internal_value(data)
 
 
-class RecipeSerializer(serializers.ModelSerializer):
+class RecipeSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     image = Base64ImageField(required=True, allow_null=True)
     author = CustomUserSerializer(default=serializers.CurrentUserDefault())
     cooking_time = serializers.IntegerField(validators=[MinValueValidator(1)])
@@ -221,6 +211,11 @@ class RecipeSerializer(serializers.ModelSerializer):
             'cooking_time'
         ]
 
+    def to_representation(self, instance):
+        if hasattr(instance, 'is_subscribed'):
+            instance.author.is_subscribed = instance.is_subscribed
+        return super().to_representation(instance)
+
     def check_user_item(self, obj, model):
         request = self.context.get('request')
         if request and request.user.is_authenticated:
@@ -229,6 +224,19 @@ class RecipeSerializer(serializers.ModelSerializer):
         return False
 
     def get_ingredients(self, obj):
+        if 'recipe_in_ingredient' in getattr(
+            obj, '_prefetched_objects_cache', {}
+        ):
+            return [
+                {
+                    'id': recipe_ingredient.ingredient.id,
+                    'name': recipe_ingredient.ingredient.name,
+                    'measurement_unit':
+                        recipe_ingredient.ingredient.measurement_unit,
+                    'amount': recipe_ingredient.amount,
+                }
+                for recipe_ingredient in obj.recipe_in_ingredient.all()
+            ]
         return obj.ingredients.values(
             'id',
             'name',
@@ -237,12 +245,113 @@ class RecipeSerializer(serializers.ModelSerializer):
         )
 
     def get_is_favorited(self, obj):
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
         return self.check_user_item(obj, Favorite)
 
     def get_is_in_shopping_cart(self, obj):
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
         return self.check_user_item(obj, ShoppingCart)
 
 
+RECIPE_READ_FIELDS = (
+    'id',
+    'name',
+    'image',
+    'text',
+    'cooking_time',
+    'author_id',
+    'author__email',
+    'author__username',
+    'author__first_name',
+    'author__last_name',
+    'is_subscribed',
+    'is_favorited',
+    'is_in_shopping_cart',
+)
+TAG_FIELDS = ('id', 'name', 'color', 'slug')
+INGREDIENT_FIELDS = ('id', 'name', 'measurement_unit', 'amount')
+
+
+def get_image_url(name, request=None):
+    """Ссылка на изображение рецепта, как у ImageField."""
+    if not name:
+        return None
+    url = Recipe._meta.get_field('image').storage.url(name)
+    if request is not None:
+        return request.build_absolute_uri(url)
+    return url
+
+
+def attach_recipe_relations(rows):
+    """Добавляет к строкам рецептов теги и ингредиенты, два запроса."""
+    rows = {row['id']: row for row in rows}
+    for row in rows.values():
+        row['tags'] = []
+        row['ingredients'] = []
+    for recipe_id, *tag in RecipeTag.objects.filter(
+        recipe_id__in=rows
+    ).order_by('tag_id').values_list(
+        'recipe_id', 'tag_id', 'tag__name', 'tag__color', 'tag__slug'
+    ):
+        rows[recipe_id]['tags'].append(dict(zip(TAG_FIELDS, tag)))
+    for recipe_id, *ingredient in RecipeIngredient.objects.filter(
+        recipe_id__in=rows
+    ).order_by('ingredient__name', 'ingredient_id').values_list(
+        'recipe_id', 'ingredient_id', 'ingredient__name',
+        'ingredient__measurement_unit', 'amount'
+    ):
+        rows[recipe_id]['ingredients'].append(
+            dict(zip(INGREDIENT_FIELDS, ingredient))
+        )
+
+
+class RecipeReadListSerializer(serializers.ListSerializer):
+    def to_representation(self, data):
+        rows = list(data)
+        attach_recipe_relations(rows)
+        return [self.child.to_representation(row) for row in rows]
+
+
+class RecipeReadSerializer(serializers.BaseSerializer):
+    """
+    Сериализатор рецептов только для чтения. Принимает строки
+    .values(*RECIPE_READ_FIELDS) и собирает тот же ответ, что и
+    RecipeSerializer, без обхода полей DRF.
+    """
+
+    class Meta:
+        list_serializer_class = RecipeReadListSerializer
+
+    def to_representation(self, row):
+        if 'tags' not in row:
+            attach_recipe_relations([row])
+        with measure('serializer'):
+            return {
+                'id': row['id'],
+                'tags': row['tags'],
+                'author': {
+                    'email': row['author__email'],
+                    'id': row['author_id'],
+                    'username': row['author__username'],
+                    'first_name': row['author__first_name'],
+                    'last_name': row['author__last_name'],
+                    'is_subscribed': row['is_subscribed'],
+                },
+                'ingredients': row['ingredients'],
+                'is_favorited': row['is_favorited'],
+                'is_in_shopping_cart': row['is_in_shopping_cart'],
+                'image': get_image_url(
+                    row['image'],
+                    self.context.get('request')
+                ),
+                'name': row['name'],
+                'text': row['text'],
+                'cooking_time': row['cooking_time'],
+            }
+
+
 class RecipeCreateSerializer(serializers.ModelSerializer):
     image = Base64ImageField(use_url=True)
     tags = serializers.PrimaryKeyRelatedField(
@@ -278,64 +387,117 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
             raise ValidationError(
                 'Поле ингредиенты обязательно для заполнения'
             )
-        ingredient_set = {ingredient[id] for ingredient in ingredients}
-        if len(ingredients) != len(ingredient_set):
+        ingredient_ids = [ingredient['id'] for ingredient in ingredients]
+        if len(ingredient_ids) != len(set(ingredient_ids)):
             raise ValidationError('Ингредиенты не должны повторяться.')
+        existing = Ingredient.objects.in_bulk(ingredient_ids)
+        missing = [str(pk) for pk in ingredient_ids if pk not in existing]
+        if missing:
+            raise ValidationError(
+                f'Ингредиенты с id {", ".join(missing)} не найдены.'
+            )
+        for ingredient in ingredients:
+            ingredient['ingredient'] = existing[ingredient['id']]
         return ingredients
 
     def validate(self, attrs):
-        tags = attrs.get('tags')
-        ingredients = attrs.get('ingredients')
-
-        validated_tags = self.validate_tags(tags)
-        validated_ingredients = self.validate_ingredients(ingredients)
-
-        attrs['tags'] = validated_tags
-        attrs['ingredients'] = validated_ingredients
-
+        if 'tags' not in attrs:
+            raise ValidationError(
+                {'tags': 'Поле теги обязательно для заполнения'}
+            )
+        if 'ingredients' not in attrs:
+            raise ValidationError(
+                {'ingredients': 'Поле ингредиенты обязательно для заполнения'}
+            )
         return attrs
 
-    def link_ingredients_and_tags(self, recipe, tags, ingredients):
-        recipe.tags.set(tags)
-        RecipeIngredient.objects.bulk_create(
-            [RecipeIngredient(
-                ingredient=Ingredient.objects.get(id=ingredient['id']),
+    def link_tags(self, recipe, tags):
+        """Добавляет новые теги рецепта и удаляет убранные."""
+        tag_ids = {tag.id for tag in tags}
+        current_tag_ids = set(
+            RecipeTag.objects.filter(recipe=recipe).values_list(
+                'tag_id', flat=True
+            )
+        )
+        removed_tag_ids = current_tag_ids - tag_ids
+        if removed_tag_ids:
+            RecipeTag.objects.filter(
                 recipe=recipe,
-                amount=ingredient['amount']
-            ) for ingredient in ingredients]
+                tag_id__in=removed_tag_ids
+            ).delete()
+        RecipeTag.objects.bulk_create(
+            [RecipeTag(recipe=recipe, tag_id=tag_id)
+             for tag_id in tag_ids - current_tag_ids]
         )
 
-        return recipe
+    def link_ingredients(self, recipe, ingredients):
+        """
+        Добавляет новые ингредиенты рецепта, обновляет изменившееся
+        количество и удаляет убранные.
+        """
+        current = {
+            recipe_ingredient.ingredient_id: recipe_ingredient
+            for recipe_ingredient in RecipeIngredient.objects.filter(
+                recipe=recipe
+            )
+        }
+        created, updated = [], []
+        for ingredient in ingredients:
+            recipe_ingredient = current.pop(ingredient['id'], None)
+            if recipe_ingredient is None:
+                created.append(RecipeIngredient(
+                    ingredient=ingredient['ingredient'],
+                    recipe=recipe,
+                    amount=ingredient['amount']
+                ))
+            elif recipe_ingredient.amount != ingredient['amount']:
+                recipe_ingredient.amount = ingredient['amount']
+                updated.append(recipe_ingredient)
+        if current:
+            RecipeIngredient.objects.filter(
+                id__in=[item.id for item in current.values()]
+            ).delete()
+        if updated:
+            RecipeIngredient.objects.bulk_update(updated, ['amount'])
+        RecipeIngredient.objects.bulk_create(created)
 
     @transaction.atomic
     def create(self, validated_data):
         tags = validated_data.pop('tags')
-        ingredients_data = validated_data.pop('ingredients')
+        ingredients = validated_data.pop('ingredients')
 
         recipe = Recipe.objects.create(**validated_data)
-        recipe = self.link_ingredients_and_tags(
-            recipe,
-            tags,
-            ingredients_data
+        RecipeTag.objects.bulk_create(
+            [RecipeTag(recipe=recipe, tag=tag) for tag in tags]
         )
+        RecipeIngredient.objects.bulk_create(
+            [RecipeIngredient(
+                ingredient=ingredient['ingredient'],
+                recipe=recipe,
+                amount=ingredient['amount']
+            ) for ingredient in ingredients]
+        )
+        fan_out(recipe)
 
         return recipe
 
     @transaction.atomic
     def update(self, instance, validated_data):
-        tags = validated_data.pop('tags', None)
-        ingredients_data = validated_data.pop('ingredients', None)
+        tags = validated_data.pop('tags')
+        ingredients = validated_data.pop('ingredients')
         instance = super().update(instance, validated_data)
-        instance.tags.clear()
-        instance.ingredients.clear()
-        instance = self.link_ingredients_and_tags(
-            instance,
-            tags,
-            ingredients_data
-        )
-        instance.save()
+        self.link_tags(instance, tags)
+        self.link_ingredients(instance, ingredients)
         return instance
 
+    def save(self, **kwargs):
+        try:
+            return super().save(**kwargs)
+        finally:
+            image = self.validated_data.get('image')
+            if image is not None:
+                image.close()
+
     def to_representation(self, instance):
         return RecipeSerializer(instance, context=self.context).data
 
@@ -346,31 +508,28 @@ class RecipeCompactSerializer(serializers.ModelSerializer):
         fields = ['id', 'name', 'image', 'cooking_time']
 
     def to_representation(self, instance):
-        representation = super(RecipeCompactSerializer,
-                               self).to_representation(instance)
-        return {
-            'id': representation['id'],
-            'name': representation['name'],
-            'image': representation['image'],
-            'cooking_time': representation['cooking_time']
-        }
+        with measure('serializer'):
+            return {
+                'id': instance.id,
+                'name': instance.name,
+                'image': get_image_url(
+                    instance.image.name,
+                    self.context.get('request')
+                ),
+                'cooking_time': instance.cooking_time
+            }
 
 
 ###########################################################
 
 
-class ShoppingCartSerializer(serializers.ModelSerializer):
-
-    class Meta:
-        model = ShoppingCart
-        fields = '__all__'
-
-
-###########################################################
-
-
-class FavoriteSerializer(serializers.ModelSerializer):
+class RecipeIdsSerializer(serializers.Serializer):
+    """Список id рецептов для массового добавления и удаления."""
+    recipes = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=settings.BULK_RECIPES_LIMIT
+    )
 
-    class Meta:
-        model = Favorite
-        fields = '__all__'
+    def validate_recipes(self, value):
+        return list(dict.fromkeys(value))
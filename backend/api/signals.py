@@ -0,0 +1,73 @@
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from rest_framework.authtoken.models import Token
+
+from recipes.models import Ingredient, Recipe, RecipeIngredient, RecipeTag, Tag
+from recipes.versions import bump_data_version
+from users.models import User
+
+from .authentication import invalidate_tokens
+from .cache import invalidate_author, invalidate_recipes, is_shared
+
+AUTHOR_FIELDS = frozenset(
+    ('email', 'username', 'first_name', 'last_name')
+)
+AUTHENTICATION_FIELDS = frozenset(('password', 'is_active'))
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def change_data_version(**kwargs):
+    transaction.on_commit(bump_data_version)
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+def invalidate_recipe(instance, **kwargs):
+    transaction.on_commit(partial(invalidate_recipes, instance.pk))
+
+
+@receiver(post_save, sender=RecipeIngredient)
+@receiver(post_delete, sender=RecipeIngredient)
+@receiver(post_save, sender=RecipeTag)
+@receiver(post_delete, sender=RecipeTag)
+def invalidate_recipe_relation(instance, **kwargs):
+    transaction.on_commit(partial(invalidate_recipes, instance.recipe_id))
+
+
+@receiver(post_save, sender=User)
+def invalidate_author_recipes(instance, created, update_fields, **kwargs):
+    """Сброс кэша рецептов автора, если изменились его данные в них."""
+    if created or (update_fields is not None
+                   and not AUTHOR_FIELDS & update_fields):
+        return
+    transaction.on_commit(partial(invalidate_author, instance.pk))
+
+
+@receiver(post_delete, sender=Token)
+def invalidate_token(instance, **kwargs):
+    """Выход и удаление пользователя удаляют токен, в том числе каскадно."""
+    transaction.on_commit(partial(invalidate_tokens, instance.key))
+
+
+@receiver(post_save, sender=User)
+def invalidate_user_tokens(instance, created, update_fields, **kwargs):
+    """
+    Сброс кэша токенов пользователя после смены пароля или is_active.
+    Без общего кэша кэш токенов выключен, и токены не выбираются.
+    """
+    if created or not is_shared() or (
+            update_fields is not None
+            and not AUTHENTICATION_FIELDS & update_fields):
+        return
+    keys = list(
+        Token.objects.filter(user=instance).values_list('key', flat=True)
+    )
+    if keys:
+        transaction.on_commit(partial(invalidate_tokens, *keys))
@@ -0,0 +1,71 @@
+from itertools import chain, islice
+
+from django.core.handlers.asgi import ASGIRequest
+from django.db.models import QuerySet
+from django.http import StreamingHttpResponse
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+
+STREAM_CHUNK_SIZE: int = 2000
+
+
+class StreamingListMixin:
+    """
+    Список без пагинации отдаётся потоком.
+
+    Queryset читается через iterator(chunk_size) (на Postgres - серверным
+    курсором), каждая пачка сериализуется и рендерится отдельно, поэтому
+    память на запрос не зависит от размера таблицы. Ответ совпадает с
+    ответом JSONRenderer для всего списка. Первая пачка читается до
+    возврата ответа, остальные - при отправке. В режиме ASGI Django 3.2
+    перебирает потоковый ответ в цикле событий, где запросы к бд
+    запрещены, поэтому там список отдаётся целиком.
+    """
+
+    stream_chunk_size = STREAM_CHUNK_SIZE
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        if not self.can_stream(request, queryset):
+            serializer = self.get_serializer(queryset, many=True)
+            return Response(serializer.data)
+        content = self.stream(queryset)
+        # Первая пачка читается сразу: запрос к бд и его ошибки
+        # приходятся на view, а не на отправку ответа.
+        head = [next(content), next(content)]
+        return StreamingHttpResponse(
+            chain(head, content),
+            content_type=request.accepted_renderer.media_type
+        )
+
+    def can_stream(self, request, queryset):
+        renderer = request.accepted_renderer
+        return (
+            not isinstance(request._request, ASGIRequest)
+            and isinstance(queryset, QuerySet)
+            and self.paginator is None
+            and isinstance(renderer, JSONRenderer)
+            and renderer.get_indent(
+                request.accepted_media_type,
+                self.get_renderer_context()
+            ) is None
+        )
+
+    def stream(self, queryset):
+        renderer = self.request.accepted_renderer
+        renderer_context = self.get_renderer_context()
+        objects = queryset.iterator(chunk_size=self.stream_chunk_size)
+        separator = b''
+        yield b'['
+        while True:
+            chunk = list(islice(objects, self.stream_chunk_size))
+            if not chunk:
+                break
+            body = renderer.render(
+                self.get_serializer(chunk, many=True).data,
+                self.request.accepted_media_type,
+                renderer_context
+            )
+            yield separator + body[1:-1]
+            separator = b','
+        yield b']'
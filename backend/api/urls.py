@@ -1,10 +1,10 @@
 from django.urls import include, path
-from rest_framework import routers
 
+from .routers import AsyncReadRouter
 from .views import (CustomUserViewSet, IngredientsViewSet, RecipesViewSet,
                     TagsViewSet)
 
-router = routers.DefaultRouter()
+router = AsyncReadRouter()
 router.register(r'recipes', RecipesViewSet, basename='recipes')
 router.register(r'tags', TagsViewSet)
 router.register(r'ingredients', IngredientsViewSet)
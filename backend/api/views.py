@@ -1,34 +1,46 @@
-import tempfile
-
+from django.conf import settings
 from django.db import transaction
-from django.http import HttpResponse
+from django.db.models import (BooleanField, Exists, OuterRef, Prefetch, Sum,
+                              Value, prefetch_related_objects)
+from django.db.models.expressions import RawSQL
+from django.http import Http404, HttpResponse
 from django_filters.rest_framework import DjangoFilterBackend
 from djoser.views import UserViewSet
-from fpdf import FPDF
 from rest_framework import status
 from rest_framework.decorators import action
 from rest_framework.exceptions import NotFound, ValidationError
 from rest_framework.filters import OrderingFilter
 from rest_framework.generics import get_object_or_404
+from rest_framework.parsers import JSONParser, MultiPartParser
 from rest_framework.permissions import (IsAuthenticated,
                                         IsAuthenticatedOrReadOnly)
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
 from rest_framework.status import (HTTP_200_OK, HTTP_201_CREATED,
                                    HTTP_204_NO_CONTENT, HTTP_400_BAD_REQUEST)
+from rest_framework.validators import UniqueTogetherValidator
 from rest_framework.viewsets import ModelViewSet, ReadOnlyModelViewSet
 
+from recipes.counters import change_counter, change_counters
+from recipes.feed import backfill, filter_feed, prune
+from recipes.links import add_link, add_links, remove_link, remove_links
 from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
                             ShoppingCart, Tag)
+from recipes.search import ingredient_index
 from users.models import Subscribers, User
 
+from .cache import AnonymousResponseCacheMixin, ReferenceDataCacheMixin
 from .filters import IngredientFilter, RecipeFilter
+from .images import ImageSizeUploadHandler
 from .pagination import CustomPagination
+from .pdf import render_shopping_list_in_pool
 from .permissions import IsAdminOrReadOnly, IsAuthorOrAdminOrReadOnly
-from .serializers import (CustomUserSerializer, FavoriteSerializer,
+from .serializers import (RECIPE_READ_FIELDS, CustomUserSerializer,
                           IngredientSerializer, RecipeCompactSerializer,
-                          RecipeCreateSerializer, RecipeSerializer,
-                          ShoppingCartSerializer, SubscriptionCreateSerializer,
-                          SubscriptionSerializer, TagSerializer)
+                          RecipeCreateSerializer, RecipeIdsSerializer,
+                          RecipeReadSerializer, SubscriptionSerializer,
+                          TagSerializer)
+from .streaming import StreamingListMixin
 
 
 class CustomUserViewSet(UserViewSet):
@@ -58,36 +70,52 @@ class CustomUserViewSet(UserViewSet):
 
     @transaction.atomic
     def create_subscription(self, request, id):
-
-        get_object_or_404(User, id=id)
-
-        limit = request.GET.get('recipes_limit')
-        serializer = SubscriptionCreateSerializer(
-            data={
-                'user': request.user.id,
-                'author': id
-            },
-            context={'request': request, 'limit': limit}
+        """
+        Подписка одним INSERT, автор и повторная подписка проверяются
+        отдельным запросом, только если строка не добавилась.
+        Счётчик подписчиков и лента обновляются здесь же, без сигналов.
+        """
+        try:
+            author_id = int(id)
+        except ValueError:
+            raise Http404
+        if author_id == request.user.id:
+            raise ValidationError(
+                {'author': ['Нельзя подписаться на себя.']}
+            )
+        if not add_link(Subscribers, 'author', request.user.id, author_id):
+            get_object_or_404(User, id=author_id)
+            raise ValidationError({
+                api_settings.NON_FIELD_ERRORS_KEY: [
+                    UniqueTogetherValidator.message.format(
+                        field_names='user, author'
+                    )
+                ]
+            }, code='unique')
+
+        change_counter(User, author_id, 'subscribers_count', 1)
+        backfill(request.user.id, author_id)
+        author = User.objects.get(id=author_id)
+        serializer = SubscriptionSerializer(
+            author,
+            context={
+                'request': request,
+                'limit': request.GET.get('recipes_limit')
+            }
         )
-        serializer.is_valid(raise_exception=True)
-        serializer.save()
         return Response(serializer.data, status=HTTP_201_CREATED)
 
+    @transaction.atomic
     def delete_subscription(self, request, id):
-
-        author_exists = User.objects.filter(id=id).exists()
-        if not author_exists:
-            raise NotFound({'author': 'Автор не найден.'})
-
-        delete = Subscribers.objects.filter(
-            author=id,
-            user=request.user
-        ).delete()
-        if not delete[0]:
+        if not remove_link(Subscribers, 'author', request.user.id, id):
+            if not User.objects.filter(id=id).exists():
+                raise NotFound({'author': 'Автор не найден.'})
             return Response(
                 {"detail": "Страница не найдена."},
                 status=HTTP_400_BAD_REQUEST
             )
+        change_counter(User, id, 'subscribers_count', -1)
+        prune(request.user.id, id)
         return Response(status=HTTP_204_NO_CONTENT)
 
     @action(
@@ -96,30 +124,71 @@ class CustomUserViewSet(UserViewSet):
         methods=['GET']
     )
     def subscriptions(self, request):
-        paginator = CustomPagination()
-        limit = int(request.GET.get('recipes_limit', 10))
-        authors = User.objects.filter(subscribers__user=request.user)
-        paginator.page_size = limit
-        page = paginator.paginate_queryset(authors, request)
-
-        if page is not None:
-            serializer = SubscriptionSerializer(page, many=True,
-                                                context={
-                                                    'request': request,
-                                                    'limit': limit
-                                                })
-            return paginator.get_paginated_response(serializer.data)
-        serializer = SubscriptionSerializer(authors, many=True,
+        recipes_limit = self.get_recipes_limit(request)
+        authors = User.objects.filter(
+            subscribers__user=request.user
+        ).annotate(
+            is_subscribed=Value(True, output_field=BooleanField())
+        )
+        page = self.paginate_queryset(authors)
+        if page is None:
+            page = list(authors)
+        prefetch_related_objects(
+            page,
+            Prefetch(
+                'recipes',
+                queryset=self.get_limited_recipes(page, recipes_limit),
+                to_attr='limited_recipes'
+            )
+        )
+        serializer = SubscriptionSerializer(page, many=True,
                                             context={
                                                 'request': request,
-                                                'limit': limit
+                                                'limit': recipes_limit
                                             })
+        if self.paginator is not None:
+            return self.get_paginated_response(serializer.data)
         return Response(serializer.data, status=HTTP_200_OK)
 
+    def get_recipes_limit(self, request):
+        """
+        Число рецептов каждого автора в ответе, без recipes_limit -
+        SUBSCRIPTION_RECIPES_LIMIT.
+        """
+        recipes_limit = request.GET.get('recipes_limit')
+        if recipes_limit and recipes_limit.isdigit() and int(recipes_limit):
+            return int(recipes_limit)
+        return settings.SUBSCRIPTION_RECIPES_LIMIT
+
+    def get_limited_recipes(self, authors, limit):
+        """
+        Первые limit рецептов каждого автора одним запросом
+        с ROW_NUMBER() OVER (PARTITION BY author_id).
+        """
+        recipes = Recipe.objects.all()
+        if not authors:
+            return recipes
+        author_ids = [author.id for author in authors]
+        placeholders = ', '.join(['%s'] * len(author_ids))
+        ranked_recipes = (
+            'SELECT ranked.id FROM ('
+            'SELECT id, ROW_NUMBER() OVER ('
+            'PARTITION BY author_id ORDER BY name, id'
+            ') AS position '
+            f'FROM {Recipe._meta.db_table} '
+            f'WHERE author_id IN ({placeholders})'
+            ') AS ranked WHERE ranked.position <= %s'
+        )
+        return recipes.filter(
+            id__in=RawSQL(ranked_recipes, (*author_ids, limit))
+        )
+
 
-class ViewSet(ReadOnlyModelViewSet):
+class ViewSet(ReferenceDataCacheMixin, StreamingListMixin,
+              ReadOnlyModelViewSet):
     pagination_class = None
     permission_classes = [IsAdminOrReadOnly]
+    async_read_actions = ('list', 'retrieve')
 
 
 class TagsViewSet(ViewSet):
@@ -135,8 +204,14 @@ class IngredientsViewSet(ViewSet):
     filter_backends = [DjangoFilterBackend]
     filterset_class = IngredientFilter
 
+    def filter_queryset(self, queryset):
+        name = self.request.query_params.get('name')
+        if self.action == 'list' and name:
+            return ingredient_index.search(name)
+        return super().filter_queryset(queryset)
+
 
-class RecipesViewSet(ModelViewSet):
+class RecipesViewSet(AnonymousResponseCacheMixin, ModelViewSet):
     """
     ViewSet описывающий работу с рецептами и добавление в корзину и избранное.
     """
@@ -146,12 +221,73 @@ class RecipesViewSet(ModelViewSet):
     pagination_class = CustomPagination
     filter_backends = [DjangoFilterBackend, OrderingFilter]
     filterset_class = RecipeFilter
+    parser_classes = [JSONParser, MultiPartParser]
     ordering_fields = ['id']
     ordering = ['-id']
+    async_read_actions = (
+        'list', 'retrieve', 'feed', 'download_shopping_cart'
+    )
+
+    def initialize_request(self, request, *args, **kwargs):
+        request.upload_handlers.insert(0, ImageSizeUploadHandler(request))
+        return super().initialize_request(request, *args, **kwargs)
+
+    def get_queryset(self):
+        """
+        Рецепты с флагами пользователя. Для чтения - строки .values()
+        для RecipeReadSerializer, иначе модели вместе с автором, тегами
+        и ингредиентами. Количество запросов не зависит от размера
+        страницы.
+        """
+        user = self.request.user
+        if not user.is_authenticated:
+            false = Value(False, output_field=BooleanField())
+            queryset = Recipe.objects.annotate(
+                is_favorited=false,
+                is_in_shopping_cart=false,
+                is_subscribed=false,
+            )
+        else:
+            queryset = Recipe.objects.annotate(
+                is_favorited=Exists(Favorite.objects.filter(
+                    user=user, recipe=OuterRef('pk')
+                )),
+                is_in_shopping_cart=Exists(ShoppingCart.objects.filter(
+                    user=user, recipe=OuterRef('pk')
+                )),
+                is_subscribed=Exists(Subscribers.objects.filter(
+                    user=user, author=OuterRef('author')
+                )),
+            )
+        if self.request.method == 'GET':
+            return queryset.values(*RECIPE_READ_FIELDS)
+        return queryset.select_related('author').defer(
+            'search_vector'
+        ).prefetch_related(
+            'tags',
+            Prefetch(
+                'recipe_in_ingredient',
+                queryset=RecipeIngredient.objects.select_related(
+                    'ingredient'
+                ).order_by('ingredient__name', 'ingredient__id')
+            ),
+        )
+
+    def filter_queryset(self, queryset):
+        """
+        При поиске без явной сортировки рецепты упорядочены
+        по релевантности. Поиск проверяется по оценке search_rank:
+        пустой после очистки запрос фильтр пропускает.
+        """
+        queryset = super().filter_queryset(queryset)
+        if ('search_rank' in queryset.query.annotations
+                and 'ordering' not in self.request.query_params):
+            return queryset.order_by('-search_rank', '-id')
+        return queryset
 
     def get_serializer_class(self):
         if self.request.method == 'GET':
-            return RecipeSerializer
+            return RecipeReadSerializer
         return RecipeCreateSerializer
 
     @action(
@@ -164,51 +300,23 @@ class RecipesViewSet(ModelViewSet):
             return self.create_shopping_cart(request, pk)
         return self.delete_shopping_cart(request, pk)
 
-    @transaction.atomic
     def create_shopping_cart(self, request, recipe_id):
-        existing_cart = ShoppingCart.objects.filter(
-            recipe_id=recipe_id,
-            user=request.user
+        return self.add_recipe(
+            request,
+            ShoppingCart,
+            'in_carts_count',
+            recipe_id,
+            'Рецепт уже находится в корзине'
         )
-        if existing_cart.exists():
-            return Response(
-                {"error": "Рецепт уже находится в корзине"},
-                status=status.HTTP_400_BAD_REQUEST
-            )
-        try:
-            recipe = Recipe.objects.get(id=recipe_id)
-        except Recipe.DoesNotExist:
-            raise ValidationError(f'Рецепт с id {recipe_id} не найден.')
-        data = {
-            'recipe': recipe.id,
-            'user': request.user.id
-        }
-        serializer = ShoppingCartSerializer(data=data)
-        serializer.is_valid(raise_exception=True)
-        serializer.save()
-        recipe_data = RecipeCompactSerializer(recipe).data
-        return Response(recipe_data, status=status.HTTP_201_CREATED)
 
     def delete_shopping_cart(self, request, recipe_id):
-        recipe = Recipe.objects.filter(id=recipe_id).first()
-        if not recipe:
-            return Response(
-                {"detail": "Рецепт не найден."},
-                status=status.HTTP_404_NOT_FOUND
-            )
-
-        shopping_cart = ShoppingCart.objects.filter(
-            recipe=recipe,
-            user=request.user
-        ).first()
-        if not shopping_cart:
-            return Response(
-                {"detail": "Рецепт не находится в корзине."},
-                status=status.HTTP_400_BAD_REQUEST
-            )
-
-        shopping_cart.delete()
-        return Response(status=status.HTTP_204_NO_CONTENT)
+        return self.remove_recipe(
+            request,
+            ShoppingCart,
+            'in_carts_count',
+            recipe_id,
+            'Рецепт не находится в корзине.'
+        )
 
     @action(
         detail=True,
@@ -220,77 +328,126 @@ class RecipesViewSet(ModelViewSet):
             return self.create_favorite(request, pk)
         return self.delete_favorite(request, pk)
 
-    @transaction.atomic
     def create_favorite(self, request, recipe_id=None):
-        existing_cart = Favorite.objects.filter(
-            recipe_id=recipe_id,
-            user=request.user
+        return self.add_recipe(
+            request,
+            Favorite,
+            'favorites_count',
+            recipe_id,
+            'Рецепт уже находится в избранных'
         )
-        if existing_cart.exists():
-            return Response(
-                {"error": "Рецепт уже находится в избранных"},
-                status=status.HTTP_400_BAD_REQUEST
-            )
-        try:
-            recipe = Recipe.objects.get(id=recipe_id)
-        except Recipe.DoesNotExist:
-            raise ValidationError(f'Рецепт с id {recipe_id} не найден.')
-        data = {
-            'recipe': recipe.id,
-            'user': request.user.id
-        }
-        serializer = FavoriteSerializer(data=data)
-        if serializer.is_valid():
-            serializer.save()
-            recipe_data = RecipeCompactSerializer(recipe).data
-            return Response(recipe_data, status=status.HTTP_201_CREATED)
-        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
     def delete_favorite(self, request, recipe_id=None):
-        recipe = Recipe.objects.filter(id=recipe_id).first()
-        if not recipe:
-            return Response(
-                {"detail": "Рецепт не найден."},
-                status=status.HTTP_404_NOT_FOUND
-            )
+        return self.remove_recipe(
+            request,
+            Favorite,
+            'favorites_count',
+            recipe_id,
+            'Страница не найдена.'
+        )
+
+    @transaction.atomic
+    def add_recipe(self, request, model, counter, recipe_id, duplicate):
+        """
+        Добавляет рецепт в избранное или корзину одним INSERT. Рецепт
+        и повторное добавление проверяются отдельным запросом, только
+        если строка не добавилась. Счётчик меняется здесь же, без
+        сигналов.
+        """
+        if not add_link(model, 'recipe', request.user.id, recipe_id):
+            if Recipe.objects.filter(id=recipe_id).exists():
+                return Response(
+                    {"error": duplicate},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            raise ValidationError(f'Рецепт с id {recipe_id} не найден.')
+        change_counter(Recipe, recipe_id, counter, 1)
+        recipe = Recipe.objects.only(
+            'id', 'name', 'image', 'cooking_time'
+        ).get(id=recipe_id)
+        recipe_data = RecipeCompactSerializer(recipe).data
+        return Response(recipe_data, status=status.HTTP_201_CREATED)
 
-        favorite = Favorite.objects.filter(
-            recipe=recipe,
-            user_id=request.user.id
-        ).first()
-        if not favorite:
+    @transaction.atomic
+    def remove_recipe(self, request, model, counter, recipe_id, missing):
+        """Удаляет рецепт из избранного или корзины одним DELETE."""
+        if not remove_link(model, 'recipe', request.user.id, recipe_id):
+            if not Recipe.objects.filter(id=recipe_id).exists():
+                return Response(
+                    {"detail": "Рецепт не найден."},
+                    status=status.HTTP_404_NOT_FOUND
+                )
             return Response(
-                {"detail": "Страница не найдена."},
-                status=HTTP_400_BAD_REQUEST
+                {"detail": missing},
+                status=status.HTTP_400_BAD_REQUEST
             )
+        change_counter(Recipe, recipe_id, counter, -1)
+        return Response(status=status.HTTP_204_NO_CONTENT)
 
-        favorite.delete()
-        return Response(status=HTTP_204_NO_CONTENT)
+    @action(
+        detail=False,
+        methods=['POST', 'DELETE'],
+        permission_classes=[IsAuthenticated],
+        url_path='shopping_cart',
+        url_name='shopping-cart-bulk'
+    )
+    def shopping_cart_bulk(self, request):
+        return self.change_in_bulk(request, ShoppingCart, 'in_carts_count')
 
-    def create_shopping_list_pdf(self, ingredients):
-        file_path = tempfile.NamedTemporaryFile(
-            suffix=".pdf",
-            delete=False
-        ).name
-
-        pdf = FPDF()
-        pdf.add_page()
-        pdf.add_font(
-            'GeistMono',
-            '',
-            'static/font/GeistMono-Medium.ttf',
-            uni=True
-        )
-        pdf.set_font('GeistMono', size=25)
+    @action(
+        detail=False,
+        methods=['POST', 'DELETE'],
+        permission_classes=[IsAuthenticated],
+        url_path='favorite',
+        url_name='favorite-bulk'
+    )
+    def favorite_bulk(self, request):
+        return self.change_in_bulk(request, Favorite, 'favorites_count')
 
-        pdf.cell(200, 10, txt="Корзина покупок:", ln=True, align='C')
+    @transaction.atomic
+    def change_in_bulk(self, request, model, counter):
+        """
+        Добавляет (POST) или удаляет (DELETE) рецепты из списка recipes
+        и возвращает результат по каждому id.
+
+        Существующие рецепты выбираются одним запросом, строки пишутся
+        одним INSERT ... ON CONFLICT DO NOTHING или DELETE с RETURNING
+        без сигналов (см. recipes/links.py). Результат и счётчик
+        рецептов определяются строками, которые запрос действительно
+        добавил или удалил, поэтому параллельные запросы того же
+        пользователя не сбивают счётчик. Кэш анонимных ответов
+        не сбрасывается: отметки пользователя в него не попадают.
+        """
+        serializer = RecipeIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        ids = serializer.validated_data['recipes']
+        user = request.user
+        found = set(Recipe.objects.filter(id__in=ids).values_list(
+            'id', flat=True
+        ))
 
-        for ingredient, info in ingredients.items():
-            text = f"{ingredient}({info['unit']}): {info['total_amount']}"
-            pdf.cell(200, 10, txt=text, ln=True, align='C')
+        if request.method == 'POST':
+            changed = add_links(model, 'recipe', user.id, sorted(found))
+            change_counters(Recipe, changed, counter, 1)
+            done, skipped = 'added', 'already_added'
+        else:
+            changed = remove_links(model, 'recipe', user.id, sorted(found))
+            change_counters(Recipe, changed, counter, -1)
+            done, skipped = 'removed', 'not_added'
+
+        results = []
+        for pk in ids:
+            if pk not in found:
+                result = 'not_found'
+            elif pk in changed:
+                result = done
+            else:
+                result = skipped
+            results.append({'id': pk, 'status': result})
+        return Response({'results': results}, status=HTTP_200_OK)
 
-        pdf.output(name=file_path)
-        return file_path
+    def create_shopping_list_pdf(self, ingredients):
+        return render_shopping_list_in_pool(ingredients)
 
     @action(
         detail=False,
@@ -298,30 +455,35 @@ class RecipesViewSet(ModelViewSet):
         methods=['GET']
     )
     def download_shopping_cart(self, request):
-        cart_items = ShoppingCart.objects.filter(user=request.user)
-
-        ingredients = {}
-        for cart_item in cart_items:
-            recipe_ingredients = RecipeIngredient.objects.filter(
-                recipe=cart_item.recipe
-            )
-
-            for recipe_ingredient in recipe_ingredients:
-
-                ingredient = recipe_ingredient.ingredient
-                amount = recipe_ingredient.amount
-                unit = recipe_ingredient.ingredient.measurement_unit
-
-                if ingredient.name in ingredients:
-                    ingredients[ingredient.name]['total_amount'] += amount
-                else:
-                    ingredients[ingredient.name] = {
-                        'total_amount': amount,
-                        'unit': unit
-                    }
-        path = self.create_shopping_list_pdf(ingredients)
-        with open(path, 'rb') as pdf_file:
-            pdf_data = pdf_file.read()
-            response = HttpResponse(pdf_data, content_type='application/pdf')
-            response['Content-Disposition'] = f'attachment; filename="{path}"'
+        ingredients = RecipeIngredient.objects.filter(
+            recipe__shoppingcart__user=request.user
+        ).values(
+            'ingredient__name',
+            'ingredient__measurement_unit'
+        ).annotate(
+            total_amount=Sum('amount')
+        ).order_by('ingredient__name', 'ingredient__measurement_unit')
+        pdf_data = self.create_shopping_list_pdf(ingredients)
+        response = HttpResponse(pdf_data, content_type='application/pdf')
+        response['Content-Disposition'] = (
+            'attachment; filename="shopping_list.pdf"'
+        )
         return response
+
+    @action(
+        detail=False,
+        permission_classes=[IsAuthenticated],
+        methods=['GET']
+    )
+    def feed(self, request):
+        """Новые рецепты авторов, на которых подписан пользователь."""
+        queryset = filter_feed(
+            self.filter_queryset(self.get_queryset()),
+            request.user
+        )
+        page = self.paginate_queryset(queryset)
+        if page is None:
+            serializer = self.get_serializer(queryset, many=True)
+            return Response(serializer.data, status=HTTP_200_OK)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
@@ -0,0 +1,741 @@
+import asyncio
+import tempfile
+import time
+from collections import namedtuple
+from functools import partial
+from itertools import count
+from unittest import mock
+
+import pytest
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.db import connection
+from django.test import AsyncClient, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLResolver, include, path, resolve
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from api.cache import response_cache
+from api.routers import AsyncReadRouter
+from api.urls import router, urlpatterns
+from foodgram.middleware import RequestMetricsMiddleware
+from recipes.counters import change_counter, find_drift, recount
+from recipes.links import add_links, remove_link, remove_links
+from recipes.models import Favorite, Ingredient, Recipe, ShoppingCart
+from recipes.search import ingredient_index
+from recipes.seeding import PASSWORD
+from recipes.versions import bump_data_version
+from users.models import Subscribers, User
+
+from .stats import percentile
+
+IMAGE = (
+    'data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAIAAACQd1PeAAA'
+    'ADElEQVR4nGP4//8/AAX+Av4N70a4AAAAAElFTkSuQmCC'
+)
+
+# Управление аккаунтом через письма, фронтенд эти маршруты не использует.
+NOT_BENCHMARKED = {
+    'user-activation',
+    'user-resend-activation',
+    'user-reset-password',
+    'user-reset-password-confirm',
+    'user-set-username',
+    'user-reset-username',
+    'user-reset-username-confirm',
+}
+
+Case = namedtuple(
+    'Case',
+    ['route', 'method', 'url', 'user', 'data', 'status', 'budget', 'setup'],
+    defaults=[None, 200, None, None]
+)
+
+BULK_SIZE = 50
+
+signups = count()
+
+
+def recipe_data(tag, ingredient, **kwargs):
+    return {
+        'name': 'Борщ для замера',
+        'text': 'Свёкла, капуста, картофель и морковь.',
+        'cooking_time': 90,
+        'tags': [tag],
+        'ingredients': [{'id': ingredient, 'amount': 300}],
+        'image': IMAGE,
+    }
+
+
+def signup_data(**kwargs):
+    number = next(signups)
+    return {
+        'email': f'signup{number}@example.com',
+        'username': f'signup{number}',
+        'first_name': 'Имя',
+        'last_name': 'Фамилия',
+        'password': 'Пароль-для-замера',
+    }
+
+
+def new_recipe(dataset):
+    recipe = Recipe.objects.create(
+        author_id=dataset['author'],
+        name='Рецепт для удаления',
+        text='Текст',
+        cooking_time=10
+    )
+    return {'pk': recipe.pk}
+
+
+def without(model, **lookups):
+    def setup(dataset):
+        model.objects.filter(**{
+            field: dataset[key] for field, key in lookups.items()
+        }).delete()
+    return setup
+
+
+def with_(model, **lookups):
+    def setup(dataset):
+        model.objects.get_or_create(**{
+            field: dataset[key] for field, key in lookups.items()
+        })
+    return setup
+
+
+def bulk(model, added):
+    """Первые BULK_SIZE рецептов, добавленные читателем или нет."""
+    def setup(dataset):
+        ids = list(
+            Recipe.objects.order_by('id').values_list('id', flat=True)[
+                :BULK_SIZE
+            ]
+        )
+        model.objects.filter(
+            user_id=dataset['reader'], recipe_id__in=ids
+        ).delete()
+        if added:
+            for pk in ids:
+                model.objects.create(user_id=dataset['reader'], recipe_id=pk)
+        return {'recipes': ids}
+    return setup
+
+
+def bulk_data(recipes, **kwargs):
+    return {'recipes': recipes}
+
+
+def reset_password(dataset):
+    User.objects.filter(pk=dataset['reader']).update(
+        password=make_password(PASSWORD)
+    )
+
+
+def restore_token(dataset):
+    Token.objects.get_or_create(
+        user_id=dataset['reader'],
+        key=dataset['reader_token']
+    )
+
+
+CASES = [
+    Case('api-root', 'GET', '/api/', 'reader', budget=1),
+    Case('login', 'POST', '/api/auth/token/login/', 'anonymous',
+         data=lambda reader_email, **kwargs: {
+             'email': reader_email, 'password': PASSWORD
+         },
+         budget=3),
+    Case('logout', 'POST', '/api/auth/token/logout/', 'reader',
+         status=204, budget=3, setup=restore_token),
+
+    Case('tag-list', 'GET', '/api/tags/', 'anonymous', budget=1),
+    Case('tag-detail', 'GET', '/api/tags/{tag}/', 'anonymous', budget=1),
+    Case('ingredient-list', 'GET', '/api/ingredients/', 'anonymous',
+         budget=1),
+    # Очистка кэша перед замером меняет версию справочных данных,
+    # поэтому индекс ингредиентов каждый раз перестраивается.
+    Case('ingredient-list', 'GET', '/api/ingredients/?name=бор',
+         'anonymous', budget=1),
+    Case('ingredient-detail', 'GET', '/api/ingredients/{ingredient}/',
+         'anonymous', budget=1),
+
+    Case('recipes-list', 'GET', '/api/recipes/', 'anonymous', budget=4),
+    Case('recipes-list', 'GET', '/api/recipes/', 'reader', budget=5),
+    Case('recipes-list', 'GET', '/api/recipes/?limit=100', 'reader',
+         budget=5),
+    Case('recipes-list', 'GET', '/api/recipes/?cursor=', 'reader',
+         budget=4),
+    Case('recipes-list', 'GET', '/api/recipes/?is_favorited=1', 'reader',
+         budget=5),
+    Case('recipes-list', 'GET', '/api/recipes/?is_in_shopping_cart=1',
+         'reader', budget=5),
+    Case('recipes-list', 'GET', '/api/recipes/?tags=breakfast&tags=lunch',
+         'reader', budget=6),
+    Case('recipes-list', 'GET', '/api/recipes/?author={author}', 'reader',
+         budget=5),
+    Case('recipes-list', 'GET', '/api/recipes/?search=борщ', 'reader',
+         budget=5),
+    Case('recipes-list', 'GET', '/api/recipes/?search=%20', 'anonymous',
+         budget=4),
+    Case('recipes-list', 'POST', '/api/recipes/', 'author',
+         data=recipe_data, status=201, budget=18),
+    Case('recipes-detail', 'GET', '/api/recipes/{recipe}/', 'anonymous',
+         budget=3),
+    Case('recipes-detail', 'GET', '/api/recipes/{recipe}/', 'reader',
+         budget=4),
+    Case('recipes-detail', 'PATCH', '/api/recipes/{recipe}/', 'author',
+         data=lambda **kwargs: {
+             key: value for key, value in recipe_data(**kwargs).items()
+             if key != 'image'
+         },
+         budget=15),
+    Case('recipes-detail', 'DELETE', '/api/recipes/{pk}/', 'author',
+         status=204, budget=12, setup=new_recipe),
+    Case('recipes-feed', 'GET', '/api/recipes/feed/', 'reader', budget=5),
+    Case('recipes-favorite', 'POST', '/api/recipes/{recipe}/favorite/',
+         'reader', status=201, budget=6,
+         setup=without(Favorite, user_id='reader', recipe_id='recipe')),
+    Case('recipes-favorite', 'DELETE', '/api/recipes/{recipe}/favorite/',
+         'reader', status=204, budget=5,
+         setup=with_(Favorite, user_id='reader', recipe_id='recipe')),
+    Case('recipes-shopping-cart', 'POST',
+         '/api/recipes/{recipe}/shopping_cart/', 'reader',
+         status=201, budget=6,
+         setup=without(ShoppingCart, user_id='reader', recipe_id='recipe')),
+    Case('recipes-shopping-cart', 'DELETE',
+         '/api/recipes/{recipe}/shopping_cart/', 'reader',
+         status=204, budget=5,
+         setup=with_(ShoppingCart, user_id='reader', recipe_id='recipe')),
+    Case('recipes-favorite-bulk', 'POST', '/api/recipes/favorite/',
+         'reader', data=bulk_data, budget=6,
+         setup=bulk(Favorite, added=False)),
+    Case('recipes-favorite-bulk', 'DELETE', '/api/recipes/favorite/',
+         'reader', data=bulk_data, budget=6,
+         setup=bulk(Favorite, added=True)),
+    Case('recipes-shopping-cart-bulk', 'POST', '/api/recipes/shopping_cart/',
+         'reader', data=bulk_data, budget=6,
+         setup=bulk(ShoppingCart, added=False)),
+    Case('recipes-shopping-cart-bulk', 'DELETE',
+         '/api/recipes/shopping_cart/', 'reader', data=bulk_data, budget=6,
+         setup=bulk(ShoppingCart, added=True)),
+    Case('recipes-download-shopping-cart', 'GET',
+         '/api/recipes/download_shopping_cart/', 'reader', budget=2),
+
+    Case('user-list', 'GET', '/api/users/', 'anonymous', budget=1),
+    Case('user-list', 'POST', '/api/users/', 'anonymous',
+         data=signup_data, status=201, budget=3),
+    Case('user-detail', 'GET', '/api/users/{author}/', 'reader', budget=3),
+    Case('user-me', 'GET', '/api/users/me/', 'reader', budget=2),
+    Case('user-set-password', 'POST', '/api/users/set_password/', 'reader',
+         data={
+             'current_password': PASSWORD,
+             'new_password': 'Новый-пароль-для-замера',
+         },
+         status=204, budget=3, setup=reset_password),
+    Case('user-subscriptions', 'GET',
+         '/api/users/subscriptions/?recipes_limit=3', 'reader', budget=4),
+    Case('user-subscriptions', 'GET', '/api/users/subscriptions/', 'reader',
+         budget=4),
+    Case('user-subscribe', 'POST', '/api/users/{author}/subscribe/',
+         'reader', status=201, budget=10,
+         setup=without(Subscribers, user_id='reader', author_id='author')),
+    Case('user-subscribe', 'DELETE', '/api/users/{author}/subscribe/',
+         'reader', status=204, budget=6,
+         setup=with_(Subscribers, user_id='reader', author_id='author')),
+]
+
+
+def route_names(patterns):
+    for pattern in patterns:
+        if isinstance(pattern, URLResolver):
+            yield from route_names(pattern.url_patterns)
+        else:
+            yield pattern.name
+
+
+def bench_every_route_is_covered():
+    covered = {case.route for case in CASES} | NOT_BENCHMARKED
+    assert set(route_names(urlpatterns)) == covered
+
+
+@pytest.mark.parametrize(
+    'case', CASES, ids=[f'{case.method} {case.url}' for case in CASES]
+)
+def bench_endpoint(bench, clients, dataset, case):
+    def setup():
+        arguments = case.setup(dataset) if case.setup else None
+        return {**dataset, **(arguments or {})}
+
+    bench(
+        f'{case.method} {case.url} [{case.user}]',
+        clients[case.user],
+        case.method,
+        case.url,
+        data=case.data,
+        status=case.status,
+        budget=case.budget,
+        setup=setup
+    )
+
+
+def count_queries(client, url):
+    with CaptureQueriesContext(connection) as context:
+        response = client.get(url)
+    assert response.status_code == 200
+    return len(context.captured_queries)
+
+
+def bench_recipes_list_queries_do_not_depend_on_page_size(clients):
+    assert (
+        count_queries(clients['reader'], '/api/recipes/?limit=1')
+        == count_queries(clients['reader'], '/api/recipes/?limit=100')
+    )
+
+
+def bench_subscriptions_queries_do_not_depend_on_page_size(clients):
+    url = '/api/users/subscriptions/?recipes_limit=3&limit='
+    assert (
+        count_queries(clients['reader'], url + '1')
+        == count_queries(clients['reader'], url + '100')
+    )
+
+
+def bench_cursor_does_not_replace_search_relevance(clients):
+    client = clients['reader']
+    response = client.get('/api/recipes/?search=борщ&cursor=')
+    assert response.status_code == 400
+    assert set(response.json()) == {'cursor'}
+
+    response = client.get('/api/recipes/?search=борщ&ordering=-id&cursor=')
+    assert response.status_code == 200
+    ids = [recipe['id'] for recipe in response.json()['results']]
+    assert ids and ids == sorted(ids, reverse=True)
+    assert client.get('/api/recipes/?search=%20&cursor=').status_code == 200
+
+
+def bench_subscriptions_cap_recipes_without_recipes_limit(clients):
+    response = clients['reader'].get('/api/users/subscriptions/?limit=100')
+    assert response.status_code == 200
+    authors = response.json()['results']
+    limit = settings.SUBSCRIPTION_RECIPES_LIMIT
+    assert any(author['recipes_count'] > limit for author in authors)
+    assert all(len(author['recipes']) <= limit for author in authors)
+
+
+def bench_ingredient_index_follows_data_version(clients):
+    client = clients['anonymous']
+    assert count_queries(client, '/api/ingredients/?name=бор') <= 1
+    assert count_queries(client, '/api/ingredients/?name=бор') == 0
+
+    # Изменение из другого процесса: без сигналов, только новая версия.
+    Ingredient.objects.bulk_create(
+        [Ingredient(name='борщевик', measurement_unit='г')]
+    )
+    assert 'борщевик' not in [
+        ingredient['name']
+        for ingredient in client.get('/api/ingredients/?name=бор').json()
+    ]
+    bump_data_version()
+    assert 'борщевик' in [
+        ingredient['name']
+        for ingredient in client.get('/api/ingredients/?name=бор').json()
+    ]
+
+
+@pytest.mark.parametrize('prefix', ['б', 'бор', 'Соль', 'нет такого'])
+def bench_ingredient_index_against_database(request, clients, prefix):
+    """
+    Поиск по индексу в памяти и прежний запрос name__startswith к бд.
+    """
+    rounds = max(request.config.getoption('rounds'), 20)
+
+    def database():
+        return list(Ingredient.objects.filter(
+            name__startswith=prefix
+        ).values('id', 'name', 'measurement_unit'))
+
+    ingredient_index.ensure_built()
+    timings = {}
+    for name, search in (
+        ('database', database),
+        ('index', partial(ingredient_index.search, prefix)),
+    ):
+        durations = []
+        for _ in range(rounds):
+            start = time.perf_counter()
+            search()
+            durations.append(time.perf_counter() - start)
+        timings[name] = percentile(durations, 50)
+        request.config.benchmark_results.append({
+            'name': f'ingredients name={prefix} [{name}]',
+            'rounds': rounds,
+            'p50_ms': timings[name] * 1000,
+            'p95_ms': percentile(durations, 95) * 1000,
+            'p99_ms': percentile(durations, 99) * 1000,
+            'queries': int(name == 'database'),
+            'budget': None,
+            'peak_kib': 0,
+            'net_kib': 0,
+        })
+    assert timings['index'] < 0.001
+
+
+@override_settings(FEED_FANOUT_LIMIT=2)
+def bench_feed_keeps_recipes_after_author_drops_below_fanout_limit(
+        db, dataset):
+    def client(user):
+        # Счётчик подписчиков автора читается заново, как в запросе.
+        result = APIClient()
+        result.force_authenticate(User.objects.get(pk=user.pk))
+        return result
+
+    def feed(user):
+        response = client(user).get('/api/recipes/feed/?limit=100')
+        assert response.status_code == 200
+        return {recipe['id'] for recipe in response.json()['results']}
+
+    def subscribe(user, method='post'):
+        response = getattr(client(user), method)(
+            f'/api/users/{author.id}/subscribe/'
+        )
+        assert response.status_code in (201, 204), response.content
+
+    def publish():
+        response = client(author).post(
+            '/api/recipes/',
+            recipe_data(dataset['tag'], dataset['ingredient']),
+            format='json'
+        )
+        assert response.status_code == 201, response.content
+        return response.json()['id']
+
+    author = User.objects.create(username='fanout', email='fanout@ex.com')
+    first, second, third = User.objects.exclude(
+        id__in=[dataset['reader'], dataset['author']]
+    )[:3]
+    subscribe(first)
+    before = publish()
+    subscribe(second)
+    # С третьим подписчиком автор популярен: third подписывается и
+    # рецепт публикуется, пока ленты дополняются при чтении.
+    subscribe(third)
+    during = publish()
+    subscribe(second, 'delete')
+
+    assert {before, during} <= feed(first)
+    assert {before, during} <= feed(third)
+
+
+@pytest.mark.parametrize('url', ['/api/tags/', '/api/ingredients/'])
+def bench_streamed_reference_data_is_cached(clients, url):
+    client = clients['anonymous']
+    bump_data_version()
+    with mock.patch.object(
+        RequestMetricsMiddleware, 'log', autospec=True
+    ) as log:
+        with CaptureQueriesContext(connection) as context:
+            response = client.get(url)
+            body = response.getvalue()
+    assert response.streaming
+    queries = len(context.captured_queries)
+    assert queries >= 1
+    # Запросы потока учтены и в заголовке, и в логе после отправки.
+    assert f'db;desc="{queries} queries"' in response['Server-Timing']
+    (_, _, _, metrics, _), _ = log.call_args
+    assert metrics.queries == queries
+
+    assert count_queries(client, url) == 0
+    assert client.get(url).content == body
+
+
+def bench_anonymous_cache_key_includes_host(clients, dataset):
+    Recipe.objects.filter(pk=dataset['recipe']).update(
+        image='recipes/images/cached.png'
+    )
+    response_cache.clear()
+    url = f'/api/recipes/{dataset["recipe"]}/'
+    for _ in range(2):
+        for host in ('a.example.com', 'b.example.com'):
+            response = clients['anonymous'].get(url, HTTP_HOST=host)
+            assert response.json()['image'].startswith(f'http://{host}/')
+
+
+def bench_author_change_invalidates_cached_recipe(
+        clients, dataset, django_capture_on_commit_callbacks):
+    response_cache.clear()
+    url = f'/api/recipes/{dataset["recipe"]}/'
+    # Первый ответ запоминает автора рецепта, второй попадает в кэш.
+    clients['anonymous'].get(url)
+    clients['anonymous'].get(url)
+    assert count_queries(clients['anonymous'], url) == 0
+
+    author = User.objects.get(pk=dataset['author'])
+    author.first_name = 'Переименован'
+    with django_capture_on_commit_callbacks(execute=True):
+        with CaptureQueriesContext(connection) as context:
+            author.save()
+    # Рецепты автора не перебираются.
+    assert not [
+        query for query in context.captured_queries
+        if 'recipes_recipe' in query['sql']
+    ]
+    response = clients['anonymous'].get(url)
+    assert response.json()['author']['first_name'] == 'Переименован'
+
+
+@override_settings(CACHES={
+    **settings.CACHES,
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': tempfile.mkdtemp(prefix='foodgram-benchmarks-'),
+    },
+})
+def bench_token_cache_is_reset_in_every_process(
+        clients, dataset, django_capture_on_commit_callbacks):
+    def me(client):
+        return count_queries(client, '/api/users/me/')
+
+    # Без кэша токен читается отдельным запросом.
+    miss = me(clients['reader'])
+    assert me(clients['reader']) == miss - 1
+    assert me(clients['author']) == miss
+
+    # Записи других пользователей не сбрасываются.
+    reader = User.objects.get(pk=dataset['reader'])
+    reader.set_password(PASSWORD)
+    with django_capture_on_commit_callbacks(execute=True):
+        reader.save()
+    assert me(clients['reader']) == miss
+    assert me(clients['author']) == miss - 1
+
+    # Запись в памяти процесса остаётся, токен сбрасывает поколение
+    # в общем кэше, как при выходе в другом воркере.
+    with django_capture_on_commit_callbacks(execute=True):
+        Token.objects.filter(key=dataset['reader_token']).delete()
+    assert clients['reader'].get('/api/users/me/').status_code == 401
+
+
+def bench_token_cache_is_off_without_shared_cache(clients, dataset):
+    assert (
+        count_queries(clients['reader'], '/api/users/me/')
+        == count_queries(clients['reader'], '/api/users/me/')
+    )
+    # Сохранение пользователя не выбирает токены для сброса.
+    with CaptureQueriesContext(connection) as context:
+        User.objects.get(pk=dataset['reader']).save()
+    assert not [
+        query for query in context.captured_queries
+        if 'authtoken_token' in query['sql']
+    ]
+
+
+def bench_shopping_cart_download_is_constant_in_cart_size(clients, dataset):
+    def download(size):
+        ShoppingCart.objects.filter(user_id=dataset['reader']).delete()
+        for recipe_id in Recipe.objects.values_list('id', flat=True)[:size]:
+            ShoppingCart.objects.create(
+                user_id=dataset['reader'],
+                recipe_id=recipe_id
+            )
+        return count_queries(
+            clients['reader'], '/api/recipes/download_shopping_cart/'
+        )
+
+    # Первый запрос процесса ещё и читает токен из бд.
+    download(1)
+    assert download(1) == download(100)
+
+
+def bench_bulk_cart_queries_do_not_depend_on_size(clients, dataset):
+    def add(size):
+        ShoppingCart.objects.filter(user_id=dataset['reader']).delete()
+        ids = list(Recipe.objects.values_list('id', flat=True)[:size])
+        with CaptureQueriesContext(connection) as context:
+            response = clients['reader'].post(
+                '/api/recipes/shopping_cart/',
+                {'recipes': ids},
+                format='json'
+            )
+        assert response.status_code == 200
+        return len(context.captured_queries)
+
+    # Первый запрос процесса ещё и читает токен из бд.
+    add(1)
+    assert add(1) == add(100)
+
+
+@pytest.mark.parametrize('method', ['post', 'delete'])
+def bench_bulk_favorite_counts_rows_written(clients, dataset, method):
+    """
+    Параллельный запрос успевает добавить или удалить избранное между
+    выборкой рецептов и записью: результат и счётчик не меняются.
+    """
+    ids = list(
+        Recipe.objects.order_by('id').values_list('id', flat=True)[:3]
+    )
+    Favorite.objects.filter(
+        user_id=dataset['reader'], recipe_id__in=ids
+    ).delete()
+    if method == 'delete':
+        for pk in ids:
+            Favorite.objects.create(user_id=dataset['reader'], recipe_id=pk)
+    counts = dict(Recipe.objects.filter(id__in=ids).values_list(
+        'id', 'favorites_count'
+    ))
+    links = {'post': add_links, 'delete': remove_links}[method]
+
+    def concurrent(model, field, user_id, target_ids):
+        if method == 'post':
+            Favorite.objects.create(user_id=user_id, recipe_id=ids[0])
+        else:
+            # Как DELETE /api/recipes/{id}/favorite/ из другого запроса.
+            remove_link(Favorite, 'recipe', user_id, ids[0])
+            change_counter(Recipe, ids[0], 'favorites_count', -1)
+        return links(model, field, user_id, target_ids)
+
+    with mock.patch(f'api.views.{links.__name__}', concurrent):
+        response = getattr(clients['reader'], method)(
+            '/api/recipes/favorite/', {'recipes': ids}, format='json'
+        )
+    assert response.status_code == 200, response.content
+    done, skipped = {
+        'post': ('added', 'already_added'),
+        'delete': ('removed', 'not_added'),
+    }[method]
+    assert [result['status'] for result in response.json()['results']] == [
+        skipped, done, done
+    ]
+    # Счётчик первого рецепта изменил сам параллельный запрос.
+    delta = 1 if method == 'post' else -1
+    assert dict(Recipe.objects.filter(id__in=ids).values_list(
+        'id', 'favorites_count'
+    )) == {pk: counts[pk] + delta for pk in ids}
+
+
+def bench_cascade_deletes_do_not_depend_on_links(db, dataset):
+    """
+    Удаление рецепта или пользователя не выбирает избранное, корзины
+    и подписки по одной строке, а счётчики остаются верными.
+    """
+    recount()
+    user_ids = list(User.objects.order_by('id').values_list('id', flat=True))
+    recipe_ids = list(
+        Recipe.objects.order_by('id').values_list('id', flat=True)
+    )
+
+    def delete(instance):
+        with CaptureQueriesContext(connection) as context:
+            instance.delete()
+        return len(context.captured_queries)
+
+    def delete_recipe(size):
+        recipe = Recipe.objects.create(
+            author_id=dataset['author'],
+            name=f'Каскад {size}',
+            text='Каскад',
+            cooking_time=1
+        )
+        for model in (Favorite, ShoppingCart):
+            model.objects.bulk_create(
+                model(user_id=user_id, recipe=recipe)
+                for user_id in user_ids[:size]
+            )
+        recount()
+        return delete(recipe)
+
+    def delete_user(size):
+        user = User.objects.create(
+            username=f'cascade{size}',
+            email=f'cascade{size}@example.com'
+        )
+        Subscribers.objects.bulk_create(
+            Subscribers(user_id=user_id, author=user)
+            for user_id in user_ids[:size]
+        )
+        Subscribers.objects.bulk_create(
+            Subscribers(user=user, author_id=author_id)
+            for author_id in user_ids[:size]
+        )
+        for model in (Favorite, ShoppingCart):
+            model.objects.bulk_create(
+                model(user=user, recipe_id=recipe_id)
+                for recipe_id in recipe_ids[:size]
+            )
+        recount()
+        return delete(user)
+
+    assert delete_recipe(1) == delete_recipe(40)
+    assert delete_user(1) == delete_user(40)
+    assert find_drift() == []
+
+
+class AsgiUrls:
+    """Роутер API, собранный как при SERVER_MODE=asgi."""
+
+    def __init__(self):
+        asgi_router = AsyncReadRouter()
+        asgi_router.registry.extend(router.registry)
+        with override_settings(SERVER_MODE='asgi'):
+            self.urlpatterns = [path('api/', include(asgi_router.urls))]
+
+
+ASGI_URLS = [
+    '/api/recipes/',
+    '/api/recipes/?limit=100',
+    '/api/recipes/{recipe}/',
+    '/api/recipes/feed/',
+    '/api/recipes/download_shopping_cart/',
+    '/api/tags/',
+]
+
+
+@pytest.mark.parametrize('url', ASGI_URLS)
+def bench_asgi_read_views_match_wsgi(request, clients, dataset, url):
+    """
+    Чтение через AsyncReadRouter и ASGI-обработчик отдаёт то же, что
+    и WSGI, оба времени попадают в отчёт.
+    """
+    url = url.format(**dataset)
+    asgi_client = AsyncClient()
+    rounds = request.config.getoption('rounds')
+
+    def wsgi_get():
+        response = clients['reader'].get(url)
+        return response, response.getvalue()
+
+    def asgi_get():
+        response = asyncio.run(asgi_client.get(
+            url, authorization=f'Token {dataset["reader_token"]}'
+        ))
+        return response, response.getvalue()
+
+    with override_settings(ROOT_URLCONF=AsgiUrls()):
+        assert asyncio.iscoroutinefunction(resolve(url.split('?')[0]).func)
+        for name, get in (('wsgi', wsgi_get), ('asgi', asgi_get)):
+            durations = []
+            for _ in range(rounds + 1):
+                start = time.perf_counter()
+                response, content = get()
+                durations.append(time.perf_counter() - start)
+                assert response.status_code == 200, content[:500]
+            if name == 'wsgi':
+                expected = content
+            elif url.endswith('download_shopping_cart/'):
+                # В pdf записано время создания.
+                assert content.startswith(b'%PDF')
+                assert len(content) == len(expected)
+            else:
+                assert content == expected
+            request.config.benchmark_results.append({
+                'name': f'GET {url} [{name}]',
+                'rounds': rounds,
+                'p50_ms': percentile(durations[1:], 50) * 1000,
+                'p95_ms': percentile(durations[1:], 95) * 1000,
+                'p99_ms': percentile(durations[1:], 99) * 1000,
+                'queries': 0,
+                'budget': None,
+                'peak_kib': 0,
+                'net_kib': 0,
+            })
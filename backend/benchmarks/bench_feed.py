@@ -0,0 +1,159 @@
+import time
+
+import pytest
+from django.contrib.auth.hashers import make_password
+from django.db import connection
+from django.test import override_settings
+
+from api.pagination import PAGE_SIZE
+from recipes.feed import fan_out, filter_feed
+from recipes.models import FeedEntry, Recipe
+from recipes.seeding import PASSWORD, copy_rows, insert_rows, table_and_columns
+from users.models import Subscribers, User
+
+from .stats import percentile
+
+AUTHORS = 1000
+RECIPES_PER_AUTHOR = 2
+FOLLOWS = 200
+# Сколько строк подписок строится при --scale: 1M только на large.
+SUBSCRIPTIONS = [10 ** 4, 10 ** 5, 10 ** 6]
+MAX_SUBSCRIPTIONS = {'small': 10 ** 4, 'medium': 10 ** 5, 'large': 10 ** 6}
+
+
+def create_users(prefix, count):
+    password = make_password(PASSWORD)
+    User.objects.bulk_create(
+        (
+            User(
+                username=f'{prefix}{number}',
+                email=f'{prefix}{number}@example.com',
+                password=password
+            )
+            for number in range(count)
+        ),
+        batch_size=1000
+    )
+    return list(User.objects.filter(
+        username__startswith=prefix
+    ).order_by('id').values_list('id', flat=True))
+
+
+def build_subscriptions(size):
+    """
+    AUTHORS авторов по RECIPES_PER_AUTHOR рецепта и size / FOLLOWS
+    читателей, каждый подписан на FOLLOWS авторов. Ленты заполнены
+    для всех подписок, как при fan-out on write.
+    """
+    authors = create_users('feed-author-', AUTHORS)
+    readers = create_users('feed-reader-', size // FOLLOWS)
+    Recipe.objects.bulk_create(
+        (
+            Recipe(
+                author_id=author_id,
+                name=f'Лента {author_id} {number}',
+                text='Лента',
+                cooking_time=1
+            )
+            for author_id in authors
+            for number in range(RECIPES_PER_AUTHOR)
+        ),
+        batch_size=1000
+    )
+    writer = copy_rows if connection.vendor == 'postgresql' else insert_rows
+    writer(Subscribers, [
+        (reader_id, authors[(index * 7 + follow * 13) % AUTHORS])
+        for index, reader_id in enumerate(readers)
+        for follow in range(FOLLOWS)
+    ])
+    subscriptions = Subscribers.objects.filter(
+        user_id__in=readers
+    ).values_list('user_id', 'author__recipes__id', 'author_id')
+    sql, params = subscriptions.query.sql_with_params()
+    table, columns = table_and_columns(FeedEntry)
+    with connection.cursor() as cursor:
+        cursor.execute(f'INSERT INTO {table} ({columns}) {sql}', params)
+    return authors, readers
+
+
+def read_time_feed(queryset, user):
+    """Fan-out on read: рецепты авторов из подписок пользователя."""
+    return queryset.filter(
+        author__in=Subscribers.objects.filter(user=user).values('author')
+    )
+
+
+def timings(rounds, function):
+    durations = []
+    for _ in range(rounds + 1):
+        start = time.perf_counter()
+        function()
+        durations.append(time.perf_counter() - start)
+    return durations[1:]
+
+
+def report(request, name, rounds, durations):
+    request.config.benchmark_results.append({
+        'name': name,
+        'rounds': rounds,
+        'p50_ms': percentile(durations, 50) * 1000,
+        'p95_ms': percentile(durations, 95) * 1000,
+        'p99_ms': percentile(durations, 99) * 1000,
+        'queries': 0,
+        'budget': None,
+        'peak_kib': 0,
+        'net_kib': 0,
+    })
+
+
+@pytest.mark.parametrize('size', SUBSCRIPTIONS)
+def bench_feed_strategies(request, db, size):
+    """
+    Первая страница ленты с количеством при size строках подписок:
+    по ленте FeedEntry и по подпискам при чтении. Для записи -
+    раскладка нового рецепта по лентам подписчиков автора.
+    """
+    if size > MAX_SUBSCRIPTIONS[request.config.getoption('scale')]:
+        pytest.skip('Increase --scale to build this many subscriptions.')
+    rounds = max(request.config.getoption('rounds'), 5)
+    authors, readers = build_subscriptions(size)
+    reader = User.objects.get(pk=readers[-1])
+    recipes = Recipe.objects.order_by('-id')
+
+    def page(feed):
+        def read():
+            queryset = feed(recipes, reader)
+            return list(queryset[:PAGE_SIZE]), queryset.count()
+        return read
+
+    timeline, read_time = page(filter_feed)(), page(read_time_feed)()
+    assert timeline == read_time
+    assert timeline[1] == FOLLOWS * RECIPES_PER_AUTHOR
+    for name, feed in (('timeline', filter_feed),
+                       ('fan-out on read', read_time_feed)):
+        report(
+            request,
+            f'feed page, {size} subscriptions [{name}]',
+            rounds,
+            timings(rounds, page(feed))
+        )
+
+    author = User.objects.get(pk=authors[0])
+    author.subscribers_count = Subscribers.objects.filter(
+        author=author
+    ).count()
+
+    def write():
+        recipe = Recipe.objects.create(
+            author=author, name='Новый', text='Новый', cooking_time=1
+        )
+        fan_out(recipe)
+
+    with override_settings(FEED_FANOUT_LIMIT=size):
+        report(
+            request,
+            f'feed create and fan-out of one recipe to '
+            f'{author.subscribers_count} subscribers',
+            rounds,
+            timings(rounds, write)
+        )
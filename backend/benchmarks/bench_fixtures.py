@@ -0,0 +1,91 @@
+import io
+import json
+import os
+import tempfile
+import time
+import tracemalloc
+
+from django.conf import settings
+from django.core.management import call_command
+
+from recipes.models import Ingredient
+
+FIXTURE = os.path.join(settings.BASE_DIR, 'static', 'data', 'ingredients.json')
+
+
+def multiplied_fixture(copies):
+    """
+    ingredients.json, повторённый copies раз с разными названиями.
+    Файл пишется по одному элементу и удаляется после замера.
+    """
+    with open(FIXTURE, encoding='utf-8') as file:
+        rows = json.load(file)
+    file = tempfile.NamedTemporaryFile(
+        'w', encoding='utf-8', suffix='.json', delete=False
+    )
+    with file:
+        file.write('[\n')
+        for copy in range(copies):
+            for number, row in enumerate(rows):
+                if copy or number:
+                    file.write(',\n')
+                json.dump(
+                    {**row, 'name': f'{row["name"]} {copy}'},
+                    file,
+                    ensure_ascii=False
+                )
+        file.write('\n]\n')
+    return file.name, len(rows) * copies
+
+
+def upload(path):
+    call_command('ingredients_upload_fixture', path, stdout=io.StringIO())
+
+
+def measure(request, copies):
+    """Время загрузки и, отдельным прогоном, память под tracemalloc."""
+    path, rows = multiplied_fixture(copies)
+    try:
+        Ingredient.objects.all().delete()
+        start = time.perf_counter()
+        upload(path)
+        duration = time.perf_counter() - start
+        assert Ingredient.objects.count() == rows
+
+        Ingredient.objects.all().delete()
+        tracemalloc.start()
+        try:
+            upload(path)
+            net, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+    finally:
+        os.unlink(path)
+
+    request.config.benchmark_results.append({
+        'name': (
+            f'ingredients.json x{copies} upload {rows / duration:.0f} rows/s'
+        ),
+        'rounds': 1,
+        'p50_ms': duration * 1000,
+        'p95_ms': duration * 1000,
+        'p99_ms': duration * 1000,
+        'queries': 0,
+        'budget': None,
+        'peak_kib': peak / 1024,
+        'net_kib': net / 1024,
+    })
+    return duration / rows, peak
+
+
+def bench_ingredients_fixture_upload_is_streamed(request, db):
+    """
+    Память загрузки не зависит от размера файла: json читается
+    частями, строки пишутся пачками по BATCH_SIZE. Время на строку
+    тоже почти не растёт.
+    """
+    single_row, single_peak = measure(request, 1)
+    row, peak = measure(request, 100)
+    # Замерено 1.5 и 1.9 МиБ при файле ×100 около 15 МиБ.
+    assert peak < 2 * single_peak
+    assert row < 3 * single_row
@@ -0,0 +1,118 @@
+import os
+import tempfile
+import time
+
+import pytest
+from django.test import override_settings
+from fpdf import FPDF
+
+from api.pdf import (FONT_PATH, RenderUnavailable, render_pool,
+                     render_shopping_list, render_shopping_list_in_pool)
+
+from .stats import percentile
+
+
+def shopping_list(size):
+    return [
+        {
+            'ingredient__name': f'ингредиент {number}',
+            'ingredient__measurement_unit': 'г',
+            'total_amount': number * 10,
+        }
+        for number in range(size)
+    ]
+
+
+def render_with_temporary_file(ingredients):
+    """
+    Прежний путь create_shopping_list_pdf: шрифт добавляется заново,
+    pdf пишется во временный файл и читается обратно для ответа.
+    """
+    file_path = tempfile.NamedTemporaryFile(
+        suffix='.pdf',
+        delete=False
+    ).name
+    pdf = FPDF()
+    pdf.add_page()
+    pdf.add_font('GeistMono', '', FONT_PATH, uni=True)
+    pdf.set_font('GeistMono', size=25)
+    pdf.cell(200, 10, txt='Корзина покупок:', ln=True, align='C')
+    for ingredient in ingredients:
+        text = (
+            f"{ingredient['ingredient__name']}"
+            f"({ingredient['ingredient__measurement_unit']}): "
+            f"{ingredient['total_amount']}"
+        )
+        pdf.cell(200, 10, txt=text, ln=True, align='C')
+    pdf.output(name=file_path)
+    try:
+        with open(file_path, 'rb') as file:
+            return file.read()
+    finally:
+        # Прежний код файл не удалял, замеры не засоряют диск.
+        os.unlink(file_path)
+
+
+def timings(render, ingredients, rounds):
+    durations = []
+    for _ in range(rounds + 1):
+        start = time.perf_counter()
+        body = render(ingredients)
+        durations.append(time.perf_counter() - start)
+        assert body.startswith(b'%PDF')
+    # Первый вызов загружает шрифт в процесс и в статистику не входит.
+    return durations[1:]
+
+
+@pytest.mark.parametrize('size', [10, 70, 500])
+def bench_shopping_list_pdf_renderers(request, size):
+    rounds = max(request.config.getoption('rounds'), 5)
+    ingredients = shopping_list(size)
+    temporary_files = set(os.listdir(tempfile.gettempdir()))
+    render_shopping_list(ingredients)
+    # Файлы других замеров могут удаляться сборщиком мусора, поэтому
+    # проверяются только новые.
+    assert not set(os.listdir(tempfile.gettempdir())) - temporary_files
+    # Время уходит в основном на fpdf и у обоих путей близко, поэтому
+    # оно только попадает в отчёт.
+    for name, render in (
+        ('temporary file', render_with_temporary_file),
+        ('in memory', render_shopping_list),
+    ):
+        durations = timings(render, ingredients, rounds)
+        request.config.benchmark_results.append({
+            'name': f'shopping list pdf x{size} [{name}]',
+            'rounds': rounds,
+            'p50_ms': percentile(durations, 50) * 1000,
+            'p95_ms': percentile(durations, 95) * 1000,
+            'p99_ms': percentile(durations, 99) * 1000,
+            'queries': 0,
+            'budget': None,
+            'peak_kib': 0,
+            'net_kib': 0,
+        })
+
+
+def bench_shopping_list_pool_recovers():
+    """
+    Пул пересоздаётся после падения рабочего процесса, а отрисовка,
+    не успевшая за PDF_RENDER_TIMEOUT, отвечает 503, а не 500.
+    """
+    ingredients = shopping_list(70)
+    expected = len(render_shopping_list(ingredients))
+    with override_settings(PDF_RENDER_WORKERS=1, PDF_RENDER_TIMEOUT=30):
+        try:
+            assert len(render_shopping_list_in_pool(ingredients)) == expected
+            pool = render_pool.get()
+            for process in list(pool._processes.values()):
+                process.kill()
+                process.join()
+            assert len(render_shopping_list_in_pool(ingredients)) == expected
+            assert render_pool.get() is not pool
+
+            with override_settings(PDF_RENDER_TIMEOUT=0):
+                with pytest.raises(RenderUnavailable) as error:
+                    render_shopping_list_in_pool(shopping_list(5000))
+            assert error.value.status_code == 503
+        finally:
+            render_pool.reset(render_pool.get())
@@ -0,0 +1,63 @@
+import re
+
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from recipes.models import RecipeTag
+
+TAG_INDEX = RecipeTag._meta.indexes[0].name
+
+
+def recipe_plans(client, url):
+    """
+    SQL запросов к рецептам, выполненных при запросе url, и их планы.
+    На Postgres последовательное чтение запрещено, чтобы на маленьком
+    наборе данных план показывал, каким индексом можно ответить.
+    """
+    with CaptureQueriesContext(connection) as context:
+        response = client.get(url)
+    assert response.status_code == 200
+    queries = [
+        query['sql'] for query in context.captured_queries
+        if 'FROM "recipes_recipe"' in query['sql']
+    ]
+    assert queries
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute('SET LOCAL enable_seqscan = off')
+        for sql in queries:
+            cursor.execute(f'{connection.ops.explain_query_prefix()} {sql}')
+            plan = '\n'.join(
+                ' '.join(map(str, row)) for row in cursor.fetchall()
+            )
+            yield sql, plan
+
+
+def assert_no_join(sql, table):
+    assert 'DISTINCT' not in sql, sql
+    assert not re.search(rf'JOIN "{table}"', sql), sql
+
+
+@pytest.mark.parametrize('url', [
+    '/api/recipes/?tags=breakfast&tags=lunch',
+    '/api/recipes/?tags=breakfast&tags=lunch&tags_mode=all',
+])
+def bench_tags_filter_reads_tag_index(clients, url):
+    for sql, plan in recipe_plans(clients['reader'], url):
+        assert_no_join(sql, RecipeTag._meta.db_table)
+        assert TAG_INDEX in plan, plan
+
+
+@pytest.mark.parametrize('url, table', [
+    ('/api/recipes/?is_favorited=1', 'recipes_favorite'),
+    ('/api/recipes/?is_favorited=0', 'recipes_favorite'),
+    ('/api/recipes/?is_in_shopping_cart=1', 'recipes_shoppingcart'),
+    ('/api/recipes/?is_in_shopping_cart=0', 'recipes_shoppingcart'),
+])
+def bench_user_filters_do_not_scan_relations(clients, url, table):
+    for sql, plan in recipe_plans(clients['reader'], url):
+        assert_no_join(sql, table)
+        assert not re.search(rf'\bSCAN U\d+\b|Seq Scan on {table}\b', plan), (
+            plan
+        )
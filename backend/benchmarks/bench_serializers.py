@@ -0,0 +1,190 @@
+import time
+import tracemalloc
+
+import pytest
+from django.contrib.auth.models import AnonymousUser
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from api.serializers import RecipeReadSerializer, RecipeSerializer
+from api.views import RecipesViewSet
+from recipes.models import (Favorite, Recipe, RecipeIngredient, RecipeTag,
+                            ShoppingCart)
+from users.models import Subscribers, User
+
+from .stats import percentile
+
+IMAGE = 'recipes/images/golden.png'
+
+
+def recipes(user, method):
+    """
+    Запрос и рецепты, как их получает RecipesViewSet: строки .values()
+    для GET, модели с prefetch для остальных методов.
+    """
+    request = Request(APIRequestFactory().generic(method, '/api/recipes/'))
+    request.user = user
+    view = RecipesViewSet(request=request, format_kwarg=None, kwargs={})
+    return request, view.get_queryset().order_by('id')
+
+
+def render(serializer_class, data, request, many=False):
+    serializer = serializer_class(
+        data, many=many, context={'request': request}
+    )
+    return JSONRenderer().render(serializer.data)
+
+
+def get_user(dataset, name):
+    if name == 'anonymous':
+        return AnonymousUser()
+    return User.objects.get(pk=dataset[name])
+
+
+def golden_ids(dataset):
+    """Рецепты с флагами читателя и без них."""
+    reader = dataset['reader']
+    ids = set(Recipe.objects.order_by('id').values_list('id', flat=True)[:30])
+    ids.update(Favorite.objects.filter(
+        user_id=reader
+    ).values_list('recipe_id', flat=True)[:10])
+    ids.update(ShoppingCart.objects.filter(
+        user_id=reader
+    ).values_list('recipe_id', flat=True)[:10])
+    ids.update(Recipe.objects.filter(
+        author__in=Subscribers.objects.filter(
+            user_id=reader
+        ).values('author')
+    ).values_list('id', flat=True)[:10])
+    return sorted(ids)
+
+
+@pytest.mark.parametrize('images', [False, True], ids=['no-image', 'image'])
+@pytest.mark.parametrize('user', ['anonymous', 'reader'])
+def bench_read_serializer_matches_model_serializer(db, dataset, user,
+                                                   images):
+    ids = golden_ids(dataset)
+    Recipe.objects.filter(id__in=ids).update(image='')
+    if images:
+        Recipe.objects.filter(id__in=ids[::2]).update(image=IMAGE)
+    request, rows = recipes(get_user(dataset, user), 'GET')
+    _, instances = recipes(get_user(dataset, user), 'POST')
+    rows = rows.filter(id__in=ids)
+    instances = instances.filter(id__in=ids)
+
+    read = render(RecipeReadSerializer, rows, request, many=True)
+    assert read == render(RecipeSerializer, instances, request, many=True)
+    for pk in ids[:5] + ids[-5:]:
+        assert render(
+            RecipeReadSerializer, rows.get(id=pk), request
+        ) == render(RecipeSerializer, instances.get(id=pk), request)
+
+    # Сравнение покрывает флаги пользователя и ссылки на изображения.
+    for field in ('"is_favorited":true', '"is_in_shopping_cart":true',
+                  '"is_subscribed":true'):
+        assert (field.encode() in read) == (user == 'reader'), field
+    assert (b'"image":"http://testserver/media/' in read) == images
+    assert b'"image":null' in read
+
+
+def clone_recipes(count):
+    """Дополняет набор данных копиями рецептов до count штук."""
+    while Recipe.objects.count() < count:
+        last = Recipe.objects.order_by('-id').values_list('id', flat=True)[0]
+        sources = list(Recipe.objects.order_by('id').values_list(
+            'id', 'author_id', 'name', 'text', 'cooking_time', 'image'
+        )[:count - Recipe.objects.count()])
+        Recipe.objects.bulk_create(
+            Recipe(
+                author_id=author_id,
+                name=name,
+                text=text,
+                cooking_time=cooking_time,
+                image=image
+            )
+            for _, author_id, name, text, cooking_time, image in sources
+        )
+        clones = dict(zip(
+            (source[0] for source in sources),
+            Recipe.objects.filter(id__gt=last).order_by('id').values_list(
+                'id', flat=True
+            )
+        ))
+        RecipeTag.objects.bulk_create(
+            RecipeTag(recipe_id=clones[recipe_id], tag_id=tag_id)
+            for recipe_id, tag_id in RecipeTag.objects.filter(
+                recipe_id__in=clones
+            ).values_list('recipe_id', 'tag_id')
+        )
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(
+                recipe_id=clones[recipe_id],
+                ingredient_id=ingredient_id,
+                amount=amount
+            )
+            for recipe_id, ingredient_id, amount in
+            RecipeIngredient.objects.filter(
+                recipe_id__in=clones
+            ).values_list('recipe_id', 'ingredient_id', 'amount')
+        )
+
+
+def throughput(request, dataset, size, serializer_class, method):
+    """
+    Время от запроса к бд до готового JSON для size рецептов читателя,
+    результат попадает в отчёт.
+    """
+    user = get_user(dataset, 'reader')
+    rounds = request.config.getoption('rounds')
+    durations, queries = [], []
+    for _ in range(rounds + 1):
+        api_request, queryset = recipes(user, method)
+        with CaptureQueriesContext(connection) as context:
+            start = time.perf_counter()
+            body = render(
+                serializer_class, queryset[:size], api_request, many=True
+            )
+            durations.append(time.perf_counter() - start)
+        queries.append(len(context.captured_queries))
+        assert body.count(b'"cooking_time"') == size
+    durations, queries = durations[1:], queries[1:]
+
+    api_request, queryset = recipes(user, method)
+    tracemalloc.start()
+    try:
+        render(serializer_class, queryset[:size], api_request, many=True)
+        net, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    p50 = percentile(durations, 50)
+    request.config.benchmark_results.append({
+        'name': (
+            f'{serializer_class.__name__} x{size} '
+            f'{size / p50:.0f} recipes/s'
+        ),
+        'rounds': rounds,
+        'p50_ms': p50 * 1000,
+        'p95_ms': percentile(durations, 95) * 1000,
+        'p99_ms': percentile(durations, 99) * 1000,
+        'queries': max(queries),
+        'budget': None,
+        'peak_kib': peak / 1024,
+        'net_kib': net / 1024,
+    })
+    # Рецепты, теги и ингредиенты, при любом числе рецептов.
+    assert max(queries) == 3
+    return p50
+
+
+@pytest.mark.parametrize('size', [100, 1000])
+def bench_recipe_serializer_throughput(request, db, dataset, size):
+    """Прежний RecipeSerializer против RecipeReadSerializer."""
+    clone_recipes(size)
+    old = throughput(request, dataset, size, RecipeSerializer, 'POST')
+    new = throughput(request, dataset, size, RecipeReadSerializer, 'GET')
+    # Замерено около 4-6 раз, запас на шум.
+    assert new * 2 < old
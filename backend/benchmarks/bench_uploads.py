@@ -0,0 +1,174 @@
+import base64
+import io
+import json
+import random
+import threading
+import time
+import tracemalloc
+
+import pytest
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import override_settings
+from django.test.client import BOUNDARY, MULTIPART_CONTENT, encode_multipart
+from django.test.utils import CaptureQueriesContext
+from PIL import Image
+from rest_framework.test import APIClient
+
+from api.images import decode_base64_image
+
+# client_max_body_size в nginx.
+BODY_SIZE = 20 * 1024 * 1024
+CONCURRENT_UPLOADS = 4
+MIB = 1024 * 1024
+
+
+def noise_png(size):
+    """PNG из случайных пикселей без сжатия, около size байт."""
+    side = int((size / 3) ** 0.5)
+    pixels = random.Random(0).randbytes(side * side * 3)
+    buffer = io.BytesIO()
+    Image.frombytes('RGB', (side, side), pixels).save(
+        buffer, 'PNG', compress_level=0
+    )
+    return buffer.getvalue()
+
+
+def recipe_fields(dataset):
+    # Рецепт не сохраняется: потоки не пишут в общую бд, а изображение
+    # разбирается и проверяется до ошибки в cooking_time.
+    return {
+        'name': 'Загрузка изображения',
+        'text': 'Текст',
+        'cooking_time': 0,
+        'tags': [dataset['tag']],
+    }
+
+
+def json_body(dataset):
+    image = noise_png(BODY_SIZE * 3 // 4 - 64 * 1024)
+    return json.dumps({
+        **recipe_fields(dataset),
+        'ingredients': [{'id': dataset['ingredient'], 'amount': 1}],
+        'image': (
+            'data:image/png;base64,' + base64.b64encode(image).decode()
+        ),
+    }).encode(), 'application/json'
+
+
+def multipart_body(dataset):
+    image = noise_png(BODY_SIZE - 64 * 1024)
+    return encode_multipart(BOUNDARY, {
+        **recipe_fields(dataset),
+        'ingredients[0]id': dataset['ingredient'],
+        'ingredients[0]amount': 1,
+        'image': SimpleUploadedFile('image.png', image, 'image/png'),
+    }), MULTIPART_CONTENT
+
+
+@pytest.mark.parametrize(
+    'encode',
+    [base64.b64encode, base64.encodebytes,
+     lambda image: base64.encodebytes(image).replace(b'\n', b'\r\n ')],
+    ids=['plain', 'wrapped', 'crlf-spaces']
+)
+def bench_base64_image_matches_b64decode(clients, dataset, encode):
+    # Несколько частей BASE64_CHUNK_SIZE, строки по 76 символов
+    # не выровнены по их границам.
+    image = noise_png(300 * 1024)
+    data = 'data:image/png;base64,' + encode(image).decode()
+    file = decode_base64_image(data)
+    try:
+        assert file.read() == image
+        assert file.size == len(image)
+    finally:
+        file.close()
+
+    response = clients['author'].post('/api/recipes/', {
+        **recipe_fields(dataset),
+        'ingredients': [{'id': dataset['ingredient'], 'amount': 1}],
+        'image': data,
+    }, format='json')
+    assert response.status_code == 400
+    assert set(response.json()) == {'cooking_time'}, response.json()
+
+
+def upload(token, body, content_type, results):
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION=f'Token {token}')
+    try:
+        with CaptureQueriesContext(connection) as context:
+            # Тело читается из общего буфера, как из сокета: generic()
+            # скопировал бы его в FakePayload и добавил к замеру.
+            response = client.request(**{
+                'PATH_INFO': '/api/recipes/',
+                'REQUEST_METHOD': 'POST',
+                'CONTENT_LENGTH': str(len(body)),
+                'CONTENT_TYPE': content_type,
+                'wsgi.input': io.BytesIO(body),
+            })
+        results.append((response, len(context.captured_queries)))
+    finally:
+        connection.close()
+
+
+@pytest.mark.parametrize(
+    'kind, make_body, limit',
+    [
+        # JSON парсер держит в памяти тело и строку из него, изображение
+        # декодируется частями прямо во временный файл. С b64decode и
+        # ContentFile на загрузку уходило больше трёх размеров тела.
+        ('json', json_body, 2),
+        # Файл из multipart пишется на диск по мере получения.
+        ('multipart', multipart_body, 0.25),
+    ],
+    ids=['json', 'multipart']
+)
+@override_settings(RECIPE_IMAGE_MAX_SIZE=BODY_SIZE)
+def bench_concurrent_image_uploads_memory(request, db, dataset, kind,
+                                          make_body, limit):
+    body, content_type = make_body(dataset)
+    assert BODY_SIZE - MIB < len(body) <= BODY_SIZE
+    results = []
+    threads = [
+        threading.Thread(
+            target=upload,
+            args=(dataset['author_token'], body, content_type, results)
+        )
+        for _ in range(CONCURRENT_UPLOADS)
+    ]
+    tracemalloc.start()
+    try:
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+        net, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    for response, _ in results:
+        assert response.status_code == 400, response.content[:500]
+        assert set(response.json()) == {'cooking_time'}, response.json()
+    assert len(results) == CONCURRENT_UPLOADS
+
+    request.config.benchmark_results.append({
+        'name': (
+            f'POST /api/recipes/ {kind} {len(body) / MIB:.0f} MiB '
+            f'x{CONCURRENT_UPLOADS} [author]'
+        ),
+        'rounds': 1,
+        'p50_ms': elapsed * 1000,
+        'p95_ms': elapsed * 1000,
+        'p99_ms': elapsed * 1000,
+        'queries': max(queries for _, queries in results),
+        'budget': None,
+        'peak_kib': peak / 1024,
+        'net_kib': net / 1024,
+    })
+    per_upload = peak / CONCURRENT_UPLOADS
+    assert per_upload < limit * len(body), (
+        f'{kind}: {per_upload / MIB:.1f} MiB per upload'
+    )
@@ -0,0 +1,167 @@
+import json
+import time
+import tracemalloc
+
+import pytest
+from django.core.cache import caches
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from .data import SCALES, build_dataset
+from .stats import percentile
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup('benchmarks')
+    group.addoption(
+        '--scale',
+        choices=sorted(SCALES),
+        default='small',
+        help='Size of the generated dataset.'
+    )
+    group.addoption(
+        '--rounds',
+        type=int,
+        default=20,
+        help='Timed requests per endpoint.'
+    )
+    group.addoption(
+        '--report',
+        default=None,
+        help='Write measurements to this JSON file.'
+    )
+
+
+def pytest_configure(config):
+    config.benchmark_results = []
+
+
+def pytest_terminal_summary(terminalreporter, config):
+    results = config.benchmark_results
+    if not results:
+        return
+    terminalreporter.write_sep(
+        '-', f'benchmarks, scale={config.getoption("scale")}, '
+             f'{connection.vendor}'
+    )
+    terminalreporter.write_line(
+        f'{"endpoint":<60}{"p50 ms":>9}{"p95 ms":>9}{"p99 ms":>9}'
+        f'{"queries":>9}{"peak KiB":>10}{"net KiB":>9}'
+    )
+    for result in results:
+        terminalreporter.write_line(
+            f'{result["name"]:<60}{result["p50_ms"]:>9.1f}'
+            f'{result["p95_ms"]:>9.1f}{result["p99_ms"]:>9.1f}'
+            f'{result["queries"]:>9}{result["peak_kib"]:>10.1f}'
+            f'{result["net_kib"]:>9.1f}'
+        )
+    report = config.getoption('report')
+    if report:
+        with open(report, 'w', encoding='utf-8') as file:
+            json.dump({
+                'scale': config.getoption('scale'),
+                'database': connection.vendor,
+                'results': results,
+            }, file, ensure_ascii=False, indent=2)
+
+
+@pytest.fixture(scope='session')
+def dataset(request, django_db_setup, django_db_blocker):
+    """
+    Данные создаются один раз за сессию вне транзакций тестов,
+    изменения в самих тестах откатываются.
+    """
+    with django_db_blocker.unblock():
+        return build_dataset(SCALES[request.config.getoption('scale')])
+
+
+@pytest.fixture
+def clients(db, dataset):
+    """Клиенты API: анонимный и с токенами читателя и автора."""
+    result = {'anonymous': APIClient()}
+    for name in ('reader', 'author'):
+        result[name] = APIClient()
+        result[name].credentials(
+            HTTP_AUTHORIZATION=f'Token {dataset[name + "_token"]}'
+        )
+    return result
+
+
+class Benchmark:
+    """
+    Замер одного эндпоинта: rounds запросов с замером времени и числа
+    запросов к бд, затем ещё один под tracemalloc для замера памяти.
+    Перед каждым запросом кэши очищаются, замеряется путь без кэша.
+    """
+
+    def __init__(self, rounds, results):
+        self.rounds = rounds
+        self.results = results
+
+    def prepare(self, url, data, setup):
+        arguments = setup() if setup is not None else {}
+        for cache in caches.all():
+            cache.clear()
+        if callable(data):
+            data = data(**arguments)
+        return url.format(**arguments), data
+
+    def request(self, client, method, url, data):
+        response = client.generic(
+            method,
+            url,
+            json.dumps(data) if data is not None else '',
+            content_type='application/json'
+        )
+        return response, response.getvalue()
+
+    def __call__(self, name, client, method, url, data=None,
+                 status=200, budget=None, setup=None):
+        durations, queries = [], []
+        for _ in range(self.rounds + 1):
+            request_url, request_data = self.prepare(url, data, setup)
+            with CaptureQueriesContext(connection) as context:
+                start = time.perf_counter()
+                response, content = self.request(
+                    client, method, request_url, request_data
+                )
+                durations.append(time.perf_counter() - start)
+            assert response.status_code == status, content[:500]
+            queries.append(len(context.captured_queries))
+        # Первый запрос прогревает процесс и в статистику не входит.
+        durations, queries = durations[1:], queries[1:]
+
+        request_url, request_data = self.prepare(url, data, setup)
+        tracemalloc.start()
+        try:
+            self.request(client, method, request_url, request_data)
+            net, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        result = {
+            'name': name,
+            'rounds': self.rounds,
+            'p50_ms': percentile(durations, 50) * 1000,
+            'p95_ms': percentile(durations, 95) * 1000,
+            'p99_ms': percentile(durations, 99) * 1000,
+            'queries': max(queries),
+            'budget': budget,
+            'peak_kib': peak / 1024,
+            'net_kib': net / 1024,
+        }
+        self.results.append(result)
+        if budget is not None:
+            assert max(queries) <= budget, (
+                f'{name}: {max(queries)} queries, budget {budget}'
+            )
+        return result
+
+
+@pytest.fixture
+def bench(request):
+    return Benchmark(
+        request.config.getoption('rounds'),
+        request.config.benchmark_results
+    )
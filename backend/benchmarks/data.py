@@ -0,0 +1,52 @@
+from collections import namedtuple
+
+from rest_framework.authtoken.models import Token
+
+from recipes.models import Recipe
+from recipes.seeding import make_plan, popular, seed
+
+Scale = namedtuple(
+    'Scale',
+    ['users', 'recipes', 'ingredients', 'favorites', 'carts', 'subscriptions']
+)
+
+SCALES = {
+    'small': Scale(users=50, recipes=500, ingredients=300,
+                   favorites=20, carts=10, subscriptions=5),
+    'medium': Scale(users=500, recipes=10000, ingredients=2000,
+                    favorites=50, carts=20, subscriptions=20),
+    'large': Scale(users=5000, recipes=100000, ingredients=2000,
+                   favorites=100, carts=30, subscriptions=30),
+}
+
+
+def build_dataset(scale, seed_value=0):
+    """
+    Создаёт набор данных размера scale (см. SCALES) тем же генератором,
+    что и команда seed_load_data. Возвращает id объектов и токены,
+    с которыми обращаются замеры.
+    """
+    plan = make_plan(
+        seed_value,
+        scale.users,
+        scale.recipes,
+        scale.favorites,
+        scale.carts,
+        scale.subscriptions,
+        ingredients=scale.ingredients
+    )
+    seed(plan)
+    reader_id = plan.user_base + plan.users - 1
+    author_id = popular(0, plan.users, plan.user_base)
+    return {
+        'reader': reader_id,
+        'reader_email': f'seed-{reader_id}@example.com',
+        'reader_token': Token.objects.create(user_id=reader_id).key,
+        'author': author_id,
+        'author_token': Token.objects.create(user_id=author_id).key,
+        'recipe': Recipe.objects.filter(
+            author_id=author_id
+        ).order_by('id').values_list('id', flat=True).first(),
+        'tag': plan.tag_ids[0],
+        'ingredient': plan.ingredient_ids[0],
+    }
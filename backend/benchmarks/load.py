@@ -0,0 +1,566 @@
+"""
+Нагрузочный прогон API по запросам postman-коллекции.
+
+Виртуальные пользователи параллельно выполняют сценарии из запросов
+коллекции, сценарий выбирается случайно с весом из --mix. Результат -
+пропускная способность, задержки и доля ошибок по каждому эндпоинту.
+
+    python -m benchmarks.load run --workers 2 --users 20 --report w2.json
+    python -m benchmarks.load compare w1.json w2.json
+"""
+import argparse
+import json
+import os
+import random
+import re
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter, defaultdict, namedtuple
+from datetime import datetime, timezone
+from pathlib import Path
+from urllib.parse import urlsplit
+
+import requests
+
+from .stats import percentile
+
+BACKEND = Path(__file__).resolve().parents[1]
+COLLECTION = (
+    BACKEND.parent / 'postman-collection' / 'diploma.postman_collection.json'
+)
+DEFAULT_MIX = 'browse=6,cook=3,author=1,social=1'
+LOAD_PREFIX = 'load-'
+FILE_CACHE = 'django.core.cache.backends.filebased.FileBasedCache'
+
+VARIABLE = re.compile(r'{{(\w+)}}')
+EXPECTED_STATUS = re.compile(r'должен быть (\d{3})')
+
+Request = namedtuple(
+    'Request', ['endpoint', 'method', 'url', 'body', 'auth', 'status']
+)
+Step = namedtuple('Step', ['request', 'capture'], defaults=[None])
+
+
+def request_auth(auth):
+    """Заголовок авторизации из настроек запроса или папки коллекции."""
+    if not auth or auth['type'] != 'apikey':
+        return None
+    fields = {field['key']: field['value'] for field in auth['apikey']}
+    return fields['key'], fields['value']
+
+
+def expected_status(item):
+    """Статус, который проверяют тесты запроса в коллекции."""
+    for event in item.get('event', []):
+        if event['listen'] == 'test':
+            found = EXPECTED_STATUS.search('\n'.join(event['script']['exec']))
+            if found:
+                return int(found.group(1))
+    return None
+
+
+def load_collection(path):
+    """
+    Читает коллекцию: запросы по именам и начальные значения переменных.
+    Подстановка переменных, как и в Postman, текстовая.
+    """
+    with open(path, encoding='utf-8') as file:
+        collection = json.load(file)
+    found = {}
+
+    def walk(items, auth):
+        for item in items:
+            if 'item' in item:
+                walk(item['item'], item.get('auth', auth))
+                continue
+            request = item['request']
+            url = request['url']
+            url = url['raw'] if isinstance(url, dict) else url
+            path = VARIABLE.sub(r'{\1}', url.replace('{{baseUrl}}', ''))
+            found.setdefault(item['name'], Request(
+                f'{request["method"]} {path}',
+                request['method'],
+                url,
+                request.get('body', {}).get('raw') or None,
+                request_auth(request.get('auth', auth)),
+                expected_status(item)
+            ))
+
+    walk(collection['item'], collection.get('auth'))
+    variables = {
+        variable['key']: variable['value']
+        for variable in collection.get('variable', [])
+    }
+    return found, variables
+
+
+def substitute(template, variables):
+    return VARIABLE.sub(lambda match: str(variables[match.group(1)]), template)
+
+
+class Recorder:
+    """Собирает задержки и статусы ответов всех виртуальных пользователей."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.statuses = defaultdict(Counter)
+        self.errors = Counter()
+
+    def add(self, endpoint, latency, status, error):
+        with self.lock:
+            self.latencies[endpoint].append(latency)
+            self.statuses[endpoint][status] += 1
+            self.errors[endpoint] += error
+
+
+def send(session, request, variables, timeout):
+    headers = {}
+    if request.auth:
+        header, value = request.auth
+        headers[header] = substitute(value, variables)
+    body = None
+    if request.body:
+        headers['Content-Type'] = 'application/json'
+        body = substitute(request.body, variables).encode()
+    return session.request(
+        request.method,
+        substitute(request.url, variables),
+        data=body,
+        headers=headers,
+        timeout=timeout
+    )
+
+
+def remember_token(user, data):
+    # Виртуальный пользователь играет все роли коллекции.
+    user.variables['userToken'] = data['auth_token']
+    user.variables['secondUserToken'] = data['auth_token']
+    return True
+
+
+def pick_recipe(user, data):
+    """
+    Выбирает рецепт из списка. Рецепты других виртуальных пользователей
+    пропускаются: их могут удалить до следующего шага сценария.
+    """
+    recipes = [
+        recipe for recipe in data['results']
+        if not recipe['author']['username'].startswith(LOAD_PREFIX)
+    ]
+    if not recipes:
+        return False
+    recipe = user.random.choice(recipes)
+    user.variables.update(
+        firstRecipeId=recipe['id'],
+        userId=recipe['author']['id'],
+        thirdUserId=recipe['author']['id']
+    )
+    return True
+
+
+def remember_recipe(user, data):
+    user.variables.update(
+        firstRecipeId=data['id'],
+        userId=data['author']['id']
+    )
+    return True
+
+
+SIGNUP = [
+    Step('create_first_user'),
+    Step('get_token_for_first_user', remember_token),
+]
+
+SCENARIOS = {
+    # Гость листает рецепты и профили авторов.
+    'browse': [
+        Step('get_tag_list // No Auth'),
+        Step('get_recipes_list // No Auth', pick_recipe),
+        Step('get_recipe_detail // No Auth'),
+        Step('get_ingredient // No Auth'),
+        Step('get_profile // No Auth'),
+    ],
+    # Пользователь отбирает рецепты и скачивает список покупок.
+    'cook': [
+        Step('get_recipes_list // User', pick_recipe),
+        Step('get_recipes_list_with_two_tags_param // User'),
+        Step('get_recipe_detail // User'),
+        Step('add_to_favorite // User'),
+        Step('add_to_shopping_cart // User'),
+        Step('get_recipes_list_with_is_in_shopping_cart_param // User'),
+        Step('download_shopping_cart // User'),
+        Step('remove_from_shopping_cart // User'),
+        Step('get_recipes_list_with_is_favorited_param // User'),
+        Step('remove_from_favorite // User'),
+    ],
+    # Автор публикует, правит и удаляет рецепт.
+    'author': [
+        Step('get_ingredients_list_with_name_filter // User'),
+        Step('create_first_recipe // Second User', remember_recipe),
+        Step('update_recipe // Second User'),
+        Step('get_recipe_detail // User'),
+        Step('get_recipes_list_with_author_param // User'),
+        Step('delete_first_recipe // Second User'),
+    ],
+    # Пользователь подписывается на автора и отписывается.
+    'social': [
+        Step('get_recipes_list // User', pick_recipe),
+        Step('get_profile // User'),
+        Step('create_subscription // User'),
+        Step('get_subscription_list_with_recipes_limit_param // User'),
+        Step('delete_first_subscription // User'),
+        Step('users_me // User'),
+    ],
+}
+
+
+class VirtualUser:
+    """
+    Регистрируется со своими email и username, получает токен и до
+    истечения времени выполняет случайные сценарии. Сценарий
+    прерывается на первом неожиданном ответе.
+    """
+
+    def __init__(self, number, collection, variables, recorder, options):
+        name = f'{LOAD_PREFIX}{options.run}-{number}'
+        self.collection = collection
+        self.variables = {
+            **variables,
+            'email': json.dumps(f'{name}@example.com'),
+            'username': json.dumps(name),
+        }
+        self.recorder = recorder
+        self.options = options
+        self.random = random.Random(f'{options.seed}-{number}')
+        self.session = requests.Session()
+
+    def step(self, step):
+        request = self.collection[step.request]
+        start = time.perf_counter()
+        try:
+            response = send(
+                self.session, request, self.variables, self.options.timeout
+            )
+        except requests.RequestException:
+            self.recorder.add(
+                request.endpoint, time.perf_counter() - start, 0, True
+            )
+            return False
+        latency = time.perf_counter() - start
+        if request.status:
+            failed = response.status_code != request.status
+        else:
+            failed = response.status_code >= 400
+        self.recorder.add(
+            request.endpoint, latency, response.status_code, failed
+        )
+        if failed:
+            return False
+        return step.capture is None or step.capture(self, response.json())
+
+    def think(self):
+        if self.options.think:
+            time.sleep(self.random.expovariate(1 / self.options.think))
+
+    def run(self, deadline):
+        for step in SIGNUP:
+            if not self.step(step):
+                return
+        names, weights = zip(*self.options.mix.items())
+        while time.monotonic() < deadline:
+            scenario = SCENARIOS[self.random.choices(names, weights)[0]]
+            for step in scenario:
+                if time.monotonic() >= deadline or not self.step(step):
+                    break
+                self.think()
+
+
+def prepare(collection, variables, timeout):
+    """Берёт из списков тегов и ингредиентов id, как тесты коллекции."""
+    with requests.Session() as session:
+        tags = send(
+            session, collection['get_tag_list // No Auth'], variables, timeout
+        ).json()
+        ingredients = send(
+            session,
+            collection['get_ingredients_list // No Auth'],
+            variables,
+            timeout
+        ).json()
+    if len(tags) < 3 or len(ingredients) < 2:
+        raise SystemExit(
+            'Load testing needs at least 3 tags and 2 ingredients, '
+            'run seed_load_data first.'
+        )
+    variables.update(
+        firstTagId=tags[0]['id'],
+        secondTagId=tags[1]['id'],
+        secondTagSlug=tags[1]['slug'],
+        thirdTagSlug=tags[2]['slug'],
+        firstIndredientId=ingredients[0]['id'],
+        secondIndredientId=ingredients[1]['id'],
+        ingredientNameFirstLatter=ingredients[0]['name'][:1]
+    )
+
+
+def server_environment(options):
+    """
+    Окружение gunicorn. Воркерам нужен общий кэш (см. api/apps.py): если
+    бэкенды кэша не заданы, используется файловый кэш во временном
+    каталоге, одинаковый при любом числе воркеров.
+    """
+    env = {
+        **os.environ,
+        'GUNICORN_WORKERS': str(options.workers),
+        'SERVER_MODE': options.server_mode,
+    }
+    location = tempfile.mkdtemp(prefix='foodgram-load-cache-')
+    for prefix, name in (('', 'default'), ('RESPONSE_', 'responses')):
+        if f'{prefix}CACHE_BACKEND' not in env:
+            env[f'{prefix}CACHE_BACKEND'] = FILE_CACHE
+            env[f'{prefix}CACHE_LOCATION'] = os.path.join(location, name)
+    return env
+
+
+def start_server(options):
+    """Запускает gunicorn с --workers процессами и ждёт первого ответа."""
+    server = subprocess.Popen(
+        [
+            sys.executable, '-m', 'gunicorn',
+            '--config', 'gunicorn.conf.py',
+            '--bind', urlsplit(options.url).netloc,
+        ],
+        cwd=BACKEND,
+        env=server_environment(options)
+    )
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise SystemExit(f'gunicorn exited with code {server.returncode}.')
+        try:
+            requests.get(f'{options.url}/api/tags/', timeout=1)
+        except requests.RequestException:
+            time.sleep(0.2)
+            continue
+        return server
+    server.terminate()
+    raise SystemExit('gunicorn did not start in 60 seconds.')
+
+
+def summarize(recorder, elapsed):
+    def row(latencies, errors, statuses):
+        return {
+            'requests': len(latencies),
+            'throughput': len(latencies) / elapsed,
+            'error_rate': errors / len(latencies),
+            'p50_ms': percentile(latencies, 50) * 1000,
+            'p95_ms': percentile(latencies, 95) * 1000,
+            'p99_ms': percentile(latencies, 99) * 1000,
+            'statuses': {
+                str(status): number for status, number in statuses.items()
+            },
+        }
+
+    endpoints = {
+        endpoint: row(
+            latencies,
+            recorder.errors[endpoint],
+            recorder.statuses[endpoint]
+        )
+        for endpoint, latencies in sorted(recorder.latencies.items())
+    }
+    endpoints['total'] = row(
+        [
+            latency
+            for latencies in recorder.latencies.values()
+            for latency in latencies
+        ],
+        sum(recorder.errors.values()),
+        sum(recorder.statuses.values(), Counter())
+    )
+    return endpoints
+
+
+def print_report(endpoints):
+    print(
+        f'{"endpoint":<60}{"req/s":>8}{"errors":>8}'
+        f'{"p50 ms":>9}{"p95 ms":>9}{"p99 ms":>9}'
+    )
+    for endpoint, result in endpoints.items():
+        print(
+            f'{endpoint:<60}{result["throughput"]:>8.1f}'
+            f'{result["error_rate"]:>8.1%}'
+            f'{result["p50_ms"]:>9.1f}{result["p95_ms"]:>9.1f}'
+            f'{result["p99_ms"]:>9.1f}'
+        )
+
+
+def run(options):
+    options.url = options.url.rstrip('/')
+    collection, variables = load_collection(options.collection)
+    variables['baseUrl'] = options.url
+    server = start_server(options) if options.workers else None
+    try:
+        prepare(collection, variables, options.timeout)
+        recorder = Recorder()
+        started = datetime.now(timezone.utc)
+        start = time.monotonic()
+        deadline = start + options.duration
+        threads = [
+            threading.Thread(
+                target=VirtualUser(
+                    number, collection, variables, recorder, options
+                ).run,
+                args=[deadline]
+            )
+            for number in range(options.users)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.monotonic() - start
+    finally:
+        if server:
+            server.terminate()
+            server.wait()
+    if not recorder.latencies:
+        raise SystemExit('No requests were made.')
+
+    endpoints = summarize(recorder, elapsed)
+    print_report(endpoints)
+    if options.report:
+        with open(options.report, 'w', encoding='utf-8') as file:
+            json.dump({
+                'run': {
+                    'started': started.isoformat(),
+                    'url': options.url,
+                    'workers': options.workers,
+                    'server_mode': options.server_mode,
+                    'users': options.users,
+                    'duration': elapsed,
+                    'think': options.think,
+                    'mix': options.mix,
+                    'seed': options.seed,
+                },
+                'endpoints': endpoints,
+            }, file, ensure_ascii=False, indent=2)
+
+
+def change(before, after):
+    if not before:
+        return ''
+    return f'{(after - before) / before:+.0%}'
+
+
+def compare(options):
+    """Сравнивает два отчёта run по общим эндпоинтам."""
+    with open(options.before, encoding='utf-8') as file:
+        before = json.load(file)
+    with open(options.after, encoding='utf-8') as file:
+        after = json.load(file)
+    for name, report in (('before', before), ('after', after)):
+        meta = report['run']
+        print(
+            f'{name}: {meta["started"]}, workers={meta["workers"]}, '
+            f'users={meta["users"]}, mix={meta["mix"]}'
+        )
+    print(
+        f'{"endpoint":<60}{"req/s":>25}{"p95 ms":>25}{"p99 ms":>25}'
+        f'{"errors":>18}'
+    )
+    for endpoint, old in before['endpoints'].items():
+        new = after['endpoints'].get(endpoint)
+        if new is None:
+            continue
+        columns = [f'{endpoint:<60}']
+        for key in ('throughput', 'p95_ms', 'p99_ms'):
+            columns.append(
+                f'{old[key]:>9.1f}{new[key]:>9.1f}'
+                f'{change(old[key], new[key]):>7}'
+            )
+        columns.append(
+            f'{old["error_rate"]:>9.1%}{new["error_rate"]:>9.1%}'
+        )
+        print(''.join(columns))
+
+
+def parse_mix(value):
+    mix = {}
+    for part in value.split(','):
+        name, _, weight = part.partition('=')
+        if name not in SCENARIOS:
+            raise argparse.ArgumentTypeError(
+                f'unknown scenario {name!r}, choose from '
+                f'{", ".join(SCENARIOS)}'
+            )
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = commands.add_parser(
+        'run', help='Replay the collection scenarios against a server.'
+    )
+    run_parser.add_argument('--url', default='http://127.0.0.1:8000')
+    run_parser.add_argument(
+        '--workers',
+        type=int,
+        default=0,
+        help='Start gunicorn with this many workers at --url. '
+             'By default the server at --url must already be running.'
+    )
+    run_parser.add_argument(
+        '--server-mode', choices=['wsgi', 'asgi'], default='wsgi'
+    )
+    run_parser.add_argument(
+        '--users', type=int, default=10, help='Concurrent virtual users.'
+    )
+    run_parser.add_argument(
+        '--duration', type=float, default=60, help='Seconds to run.'
+    )
+    run_parser.add_argument(
+        '--think',
+        type=float,
+        default=0,
+        help='Mean pause between requests of a user, seconds.'
+    )
+    run_parser.add_argument(
+        '--mix',
+        type=parse_mix,
+        default=parse_mix(DEFAULT_MIX),
+        help=f'Scenario weights, default {DEFAULT_MIX}.'
+    )
+    run_parser.add_argument('--seed', type=int, default=0)
+    run_parser.add_argument('--timeout', type=float, default=30)
+    run_parser.add_argument('--collection', default=COLLECTION)
+    run_parser.add_argument(
+        '--run',
+        default=f'{int(time.time()):x}',
+        help='Suffix of the usernames registered by this run.'
+    )
+    run_parser.add_argument(
+        '--report', default=None, help='Write results to this JSON file.'
+    )
+    run_parser.set_defaults(handler=run)
+
+    compare_parser = commands.add_parser(
+        'compare', help='Compare two JSON reports of run.'
+    )
+    compare_parser.add_argument('before')
+    compare_parser.add_argument('after')
+    compare_parser.set_defaults(handler=compare)
+
+    options = parser.parse_args()
+    options.handler(options)
+
+
+if __name__ == '__main__':
+    main()
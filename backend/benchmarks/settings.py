@@ -0,0 +1,45 @@
+import os
+import tempfile
+
+from foodgram.settings import *  # noqa: F401, F403
+from foodgram.settings import LOGGING
+
+# Без DB_HOST замеры идут на SQLite, с ним - на Postgres из .env.
+if not os.getenv('DB_HOST'):
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': ':memory:',
+        }
+    }
+
+DEBUG = False
+
+ALLOWED_HOSTS = ['*']
+
+MEDIA_ROOT = tempfile.mkdtemp(prefix='foodgram-benchmarks-')
+
+# Кэш в памяти процесса: замеры не зависят от файлов других запусков,
+# кэш токенов проверяется отдельно с FileBasedCache.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'responses': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'responses',
+    },
+}
+
+# Стоимость хэширования паролей - настройка, а не код, в замеры не входит.
+PASSWORD_HASHERS = ['django.contrib.auth.hashers.MD5PasswordHasher']
+
+# Список покупок рендерится в том же процессе, чтобы попасть в замер памяти.
+PDF_RENDER_WORKERS = int(os.getenv('PDF_RENDER_WORKERS', 0))
+
+# Часть авторов популярнее порога, чтобы лента проверялась целиком.
+FEED_FANOUT_LIMIT = int(os.getenv('FEED_FANOUT_LIMIT', 100))
+
+LOGGING['loggers']['foodgram.requests']['level'] = os.getenv(
+    'REQUEST_LOG_LEVEL', 'ERROR'
+)
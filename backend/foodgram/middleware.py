@@ -0,0 +1,211 @@
+import asyncio
+import json
+import logging
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+logger = logging.getLogger('foodgram.requests')
+
+current_metrics = ContextVar('current_metrics', default=None)
+
+
+class RequestMetrics:
+    """Счётчики запросов к бд и замеры времени в рамках одного запроса."""
+
+    def __init__(self):
+        self.view_name = None
+        self.queries = 0
+        self.db_time = 0.0
+        self.statements = Counter()
+        self.timings = defaultdict(float)
+        self.notes = {}
+        self.active = set()
+
+    def execute_wrapper(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - start
+            self.queries += 1
+            self.statements[sql] += 1
+
+    @contextmanager
+    def measure(self, name):
+        """Замер времени; вложенные замеры с тем же именем не учитываются."""
+        if name in self.active:
+            yield
+            return
+        self.active.add(name)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[name] += time.perf_counter() - start
+            self.active.discard(name)
+
+
+@contextmanager
+def measure(name):
+    """Замер времени участка кода для текущего запроса, если он есть."""
+    metrics = current_metrics.get()
+    if metrics is None:
+        yield
+        return
+    with metrics.measure(name):
+        yield
+
+
+def note(name, value):
+    """Отметка для текущего запроса, например попадание в кэш."""
+    metrics = current_metrics.get()
+    if metrics is not None:
+        metrics.notes[name] = value
+
+
+def execute_with_metrics(execute, sql, params, many, context):
+    """
+    Обёртка запросов к бд, которая учитывает их в метриках текущего
+    запроса. Текущий запрос берётся из contextvars, поэтому запросы
+    учитываются и в потоках sync_to_async в режиме ASGI.
+    """
+    metrics = current_metrics.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    return metrics.execute_wrapper(execute, sql, params, many, context)
+
+
+@receiver(connection_created)
+def install_execute_wrapper(connection, **kwargs):
+    if execute_with_metrics not in connection.execute_wrappers:
+        connection.execute_wrappers.append(execute_with_metrics)
+
+
+for connection in connections.all():
+    install_execute_wrapper(connection)
+
+
+class RequestMetricsMiddleware:
+    """
+    Считает для каждого запроса число запросов к бд, время в бд,
+    время сериализации, общее время и отметки note(). Результат
+    добавляется в заголовок Server-Timing и пишется в лог
+    foodgram.requests. Медленные запросы логируются вместе с самыми
+    повторяющимися SQL выражениями.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        metrics = RequestMetrics()
+        token = current_metrics.set(metrics)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            current_metrics.reset(token)
+        return self.finish(request, response, metrics, start)
+
+    async def __acall__(self, request):
+        metrics = RequestMetrics()
+        token = current_metrics.set(metrics)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_metrics.reset(token)
+        return self.finish(request, response, metrics, start)
+
+    def finish(self, request, response, metrics, start):
+        total = time.perf_counter() - start
+        response['Server-Timing'] = ', '.join([
+            f'db;desc="{metrics.queries} queries";'
+            f'dur={metrics.db_time * 1000:.1f}',
+            *(f'{name};dur={duration * 1000:.1f}'
+              for name, duration in metrics.timings.items()),
+            *(f'{name};desc="{value}"'
+              for name, value in metrics.notes.items()),
+            f'total;dur={total * 1000:.1f}',
+        ])
+        if response.streaming:
+            response.streaming_content = self.stream(
+                request, response, response.streaming_content, metrics,
+                start
+            )
+        else:
+            self.log(request, response, metrics, total)
+        return response
+
+    def stream(self, request, response, content, metrics, start):
+        """
+        Перебор потокового ответа учитывается в метриках запроса,
+        лог пишется после отправки последней части. Server-Timing
+        к этому времени уже отправлен и содержит только работу до
+        начала ответа.
+        """
+        content = iter(content)
+        try:
+            while True:
+                token = current_metrics.set(metrics)
+                try:
+                    chunk = next(content)
+                except StopIteration:
+                    return
+                finally:
+                    current_metrics.reset(token)
+                yield chunk
+        finally:
+            self.log(
+                request, response, metrics, time.perf_counter() - start
+            )
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        view_class = getattr(view_func, 'cls', None)
+        if view_class is None:
+            name = getattr(view_func, '__name__', repr(view_func))
+        else:
+            actions = getattr(view_func, 'actions', None) or {}
+            action = actions.get(request.method.lower(), request.method)
+            name = f'{view_class.__name__}.{action}'
+        current_metrics.get().view_name = name
+
+    def log(self, request, response, metrics, total):
+        record = {
+            'view': metrics.view_name,
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'queries': metrics.queries,
+            'db_ms': round(metrics.db_time * 1000, 1),
+            **{f'{name}_ms': round(duration * 1000, 1)
+               for name, duration in metrics.timings.items()},
+            **metrics.notes,
+            'total_ms': round(total * 1000, 1),
+        }
+        if (metrics.queries > settings.SLOW_REQUEST_QUERIES
+                or total * 1000 > settings.SLOW_REQUEST_MS):
+            record['repeated_sql'] = [
+                {'count': count, 'sql': sql}
+                for sql, count in metrics.statements.most_common(
+                    settings.SLOW_REQUEST_TOP_SQL
+                )
+                if count > 1
+            ]
+            logger.warning(json.dumps(record, ensure_ascii=False))
+        else:
+            logger.info(json.dumps(record, ensure_ascii=False))
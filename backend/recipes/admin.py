@@ -1,6 +1,7 @@
 from django.contrib import admin
 from django.contrib.admin import display
 
+from .counters import refresh_counters
 from .forms import TagForm
 from .models import (Favorite, Ingredient, Recipe, RecipeIngredient, RecipeTag,
                      ShoppingCart, Tag)
@@ -34,12 +35,13 @@ class RecipeAdmin(admin.ModelAdmin):
     )
     readonly_fields = ('added_in_favorites',)
     ordering = ['-id']
+    list_select_related = ('author',)
 
     inlines = [RecipeIngredientInline, RecipeTagInline]
 
     @display(description='Количество в избранных')
     def added_in_favorites(self, obj):
-        return Favorite.objects.filter(recipe=obj).count()
+        return obj.favorites_count
 
 
 class IngredientAdmin(admin.ModelAdmin):
@@ -66,13 +68,45 @@ class TagAdmin(admin.ModelAdmin):
     form = TagForm
 
 
-class ShoppingCartAdmin(admin.ModelAdmin):
+class LinkAdmin(admin.ModelAdmin):
+    """
+    Связи пользователя с рецептом или автором. Удаление связей сигналов
+    не отправляет, счётчик целей пересчитывается здесь.
+    """
+
+    target = 'recipe'
+    counter = None
+
+    def get_targets(self, queryset):
+        return set(queryset.values_list(f'{self.target}_id', flat=True))
+
+    def refresh(self, targets):
+        refresh_counters(*self.counter, targets)
+
+    def save_model(self, request, obj, form, change):
+        targets = self.get_targets(self.model.objects.filter(pk=obj.pk))
+        super().save_model(request, obj, form, change)
+        self.refresh(targets | {getattr(obj, f'{self.target}_id')})
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        self.refresh({getattr(obj, f'{self.target}_id')})
+
+    def delete_queryset(self, request, queryset):
+        targets = self.get_targets(queryset)
+        super().delete_queryset(request, queryset)
+        self.refresh(targets)
+
+
+class ShoppingCartAdmin(LinkAdmin):
+    counter = (Recipe, 'in_carts_count')
     list_display = ('user', 'recipe')
     list_filter = ('recipe', )
     search_fields = ('user__username', 'recipe__name')
 
 
-class FavoriteAdmin(admin.ModelAdmin):
+class FavoriteAdmin(LinkAdmin):
+    counter = (Recipe, 'favorites_count')
     list_display = ('user', 'recipe')
     list_filter = ('recipe', )
     search_fields = ('user__username', 'recipe__name')
@@ -0,0 +1,70 @@
+from django.db.models import Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from users.models import Subscribers, User
+
+from .models import Favorite, Recipe, ShoppingCart
+
+COUNTERS = (
+    (Recipe, 'favorites_count', Favorite, 'recipe'),
+    (Recipe, 'in_carts_count', ShoppingCart, 'recipe'),
+    (User, 'recipes_count', Recipe, 'author'),
+    (User, 'subscribers_count', Subscribers, 'author'),
+)
+
+
+def change_counter(model, pk, field, delta):
+    """Атомарно изменяет счётчик на delta одним UPDATE с F()."""
+    model.objects.filter(pk=pk).update(**{field: F(field) + delta})
+
+
+def change_counters(model, pks, field, delta):
+    """Изменяет счётчик у строк pks одним UPDATE."""
+    if pks:
+        model.objects.filter(pk__in=pks).update(**{field: F(field) + delta})
+
+
+def actual_count(related_model, foreign_key):
+    return Coalesce(
+        Subquery(
+            related_model.objects.filter(
+                **{foreign_key: OuterRef('pk')}
+            ).order_by().values(foreign_key).annotate(
+                count=Count('pk')
+            ).values('count')
+        ),
+        Value(0)
+    )
+
+
+def find_drift():
+    """Возвращает счётчики, значения которых расходятся с данными."""
+    drift = []
+    for model, field, related_model, foreign_key in COUNTERS:
+        rows = model.objects.annotate(
+            actual=actual_count(related_model, foreign_key)
+        ).exclude(**{field: F('actual')}).values_list('pk', field, 'actual')
+        drift.extend(
+            (model, field, pk, stored, actual)
+            for pk, stored, actual in rows
+        )
+    return drift
+
+
+def recount():
+    """Пересчитывает все счётчики, возвращает число обновлённых строк."""
+    return sum(
+        model.objects.update(
+            **{field: actual_count(related_model, foreign_key)}
+        )
+        for model, field, related_model, foreign_key in COUNTERS
+    )
+
+
+def refresh_counters(model, field, pks):
+    """Пересчитывает по данным счётчик field у строк pks."""
+    for counter_model, counter_field, related_model, foreign_key in COUNTERS:
+        if (counter_model, counter_field) == (model, field):
+            model.objects.filter(pk__in=pks).update(
+                **{field: actual_count(related_model, foreign_key)}
+            )
@@ -0,0 +1,79 @@
+from django.conf import settings
+from django.db.models import Q
+
+from users.models import Subscribers
+
+from .models import FeedEntry, Recipe
+
+BATCH_SIZE: int = 1000
+
+
+def is_fanned_out(author):
+    """
+    Рецепты автора раскладываются по лентам подписчиков, только если
+    подписчиков не больше FEED_FANOUT_LIMIT.
+    """
+    return author.subscribers_count <= settings.FEED_FANOUT_LIMIT
+
+
+def fan_out(recipe):
+    """
+    Добавляет новый рецепт в ленты подписчиков автора. Рецепт
+    популярного автора только помечается fanned_out=False и попадает
+    в ленты при чтении, даже если подписчиков потом станет меньше
+    FEED_FANOUT_LIMIT.
+    """
+    if not is_fanned_out(recipe.author):
+        recipe.fanned_out = False
+        Recipe.objects.filter(pk=recipe.pk).update(fanned_out=False)
+        return
+    FeedEntry.objects.bulk_create(
+        (
+            FeedEntry(user_id=user_id, recipe=recipe, author=recipe.author)
+            for user_id in Subscribers.objects.filter(
+                author=recipe.author
+            ).values_list('user_id', flat=True).iterator()
+        ),
+        batch_size=BATCH_SIZE,
+        ignore_conflicts=True
+    )
+
+
+def backfill(user_id, author_id):
+    """
+    Добавляет в ленту пользователя разложенные рецепты автора после
+    подписки, сколько бы подписчиков у автора ни было.
+    """
+    FeedEntry.objects.bulk_create(
+        (
+            FeedEntry(user_id=user_id, recipe_id=recipe_id,
+                      author_id=author_id)
+            for recipe_id in Recipe.objects.filter(
+                author_id=author_id,
+                fanned_out=True
+            ).values_list('id', flat=True).iterator()
+        ),
+        batch_size=BATCH_SIZE,
+        ignore_conflicts=True
+    )
+
+
+def prune(user_id, author_id):
+    """Убирает из ленты пользователя рецепты автора после отписки."""
+    FeedEntry.objects.filter(user_id=user_id, author_id=author_id).delete()
+
+
+def filter_feed(queryset, user):
+    """
+    Рецепты из ленты пользователя: записи FeedEntry плюс неразложенные
+    рецепты (fanned_out=False) авторов, на которых он подписан.
+    """
+    return queryset.filter(
+        Q(pk__in=FeedEntry.objects.filter(user=user).values('recipe'))
+        | Q(
+            fanned_out=False,
+            author__in=Subscribers.objects.filter(
+                user=user
+            ).values('author')
+        )
+    )
@@ -0,0 +1,111 @@
+from django.db import connection
+
+
+def can_return_rows():
+    """INSERT и DELETE поддерживают RETURNING (SQLite с 3.35)."""
+    if connection.vendor == 'sqlite':
+        return connection.Database.sqlite_version_info >= (3, 35)
+    return connection.vendor == 'postgresql'
+
+
+def insert_links_sql(model, field, condition):
+    """
+    INSERT ... SELECT ... ON CONFLICT DO NOTHING (INSERT OR IGNORE на
+    SQLite) связей пользователя с целями, подходящими под condition.
+    """
+    ops = connection.ops
+    target = model._meta.get_field(field)
+    target_pk = ops.quote_name(target.target_field.column)
+    return (
+        f'{ops.insert_statement(ignore_conflicts=True)} '
+        f'{ops.quote_name(model._meta.db_table)} '
+        f'({ops.quote_name(model._meta.get_field("user").column)}, '
+        f'{ops.quote_name(target.column)}) '
+        f'SELECT %s, {target_pk} '
+        f'FROM {ops.quote_name(target.related_model._meta.db_table)} '
+        f'WHERE {target_pk} {condition} '
+        f'{ops.ignore_conflicts_suffix_sql(ignore_conflicts=True)}'
+    )
+
+
+def add_link(model, field, user_id, target_id):
+    """
+    Связывает пользователя с рецептом или автором одним
+    INSERT ... SELECT ... ON CONFLICT DO NOTHING (INSERT OR IGNORE на
+    SQLite). Строка не добавляется, если цели нет или связь уже есть.
+    Возвращает True, если строка добавлена. Сигналы post_save не
+    отправляются.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            insert_links_sql(model, field, '= %s'), [user_id, target_id]
+        )
+        return cursor.rowcount == 1
+
+
+def remove_link(model, field, user_id, target_id):
+    """
+    Удаляет связь одним DELETE без выборки строк и сигналов
+    post_delete. Возвращает True, если связь была.
+    """
+    ops = connection.ops
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {ops.quote_name(model._meta.db_table)} '
+            f'WHERE {ops.quote_name(model._meta.get_field("user").column)}'
+            f' = %s AND '
+            f'{ops.quote_name(model._meta.get_field(field).column)} = %s',
+            [user_id, target_id]
+        )
+        return cursor.rowcount == 1
+
+
+def add_links(model, field, user_id, target_ids):
+    """
+    То же, что add_link, для нескольких целей одним запросом
+    с RETURNING. Возвращает множество id целей, связи с которыми
+    добавлены этим запросом. Без RETURNING связи добавляются
+    по одной.
+    """
+    if not target_ids:
+        return set()
+    if not can_return_rows():
+        return {
+            target_id for target_id in target_ids
+            if add_link(model, field, user_id, target_id)
+        }
+    ops = connection.ops
+    column = ops.quote_name(model._meta.get_field(field).column)
+    placeholders = ', '.join(['%s'] * len(target_ids))
+    sql = insert_links_sql(model, field, f'IN ({placeholders})')
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'{sql} RETURNING {column}', [user_id, *target_ids]
+        )
+        return {row[0] for row in cursor.fetchall()}
+
+
+def remove_links(model, field, user_id, target_ids):
+    """
+    То же, что remove_link, для нескольких целей одним
+    DELETE ... RETURNING. Возвращает множество id целей, связи
+    с которыми удалены этим запросом.
+    """
+    if not target_ids:
+        return set()
+    if not can_return_rows():
+        return {
+            target_id for target_id in target_ids
+            if remove_link(model, field, user_id, target_id)
+        }
+    ops = connection.ops
+    column = ops.quote_name(model._meta.get_field(field).column)
+    placeholders = ', '.join(['%s'] * len(target_ids))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {ops.quote_name(model._meta.db_table)} '
+            f'WHERE {ops.quote_name(model._meta.get_field("user").column)}'
+            f' = %s AND {column} IN ({placeholders}) RETURNING {column}',
+            [user_id, *target_ids]
+        )
+        return {row[0] for row in cursor.fetchall()}
@@ -1,47 +1,170 @@
 import csv
 import json
 import os
+import re
+from collections import defaultdict
+from itertools import islice
 
 from django.core.management.base import BaseCommand
-from django.db.utils import IntegrityError
+from django.db import transaction
 
 from recipes.models import Ingredient
+from recipes.versions import bump_data_version
+
+BATCH_SIZE: int = 1000
+JSON_CHUNK_SIZE: int = 64 * 1024
+
+SEPARATORS = re.compile(r'[\s,]*')
+
+
+def iter_json_array(file, chunk_size=JSON_CHUNK_SIZE):
+    """
+    Элементы JSON массива верхнего уровня по одному. Файл читается
+    частями по chunk_size символов, в памяти - только текущая часть
+    и недочитанный элемент.
+    """
+    decoder = json.JSONDecoder()
+    buffer = ''
+    position = 0
+    opened = False
+    while True:
+        position = SEPARATORS.match(buffer, position).end()
+        if position < len(buffer):
+            if not opened:
+                if buffer[position] != '[':
+                    raise ValueError('JSON file must contain an array.')
+                opened = True
+                position += 1
+                continue
+            if buffer[position] == ']':
+                return
+            try:
+                item, position = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                pass
+            else:
+                yield item
+                continue
+        chunk = file.read(chunk_size)
+        if not chunk:
+            raise ValueError('Unexpected end of JSON file.')
+        buffer = buffer[position:] + chunk
+        position = 0
 
 
 class Command(BaseCommand):
     """
     Класс отвечающий команду за импортирующую фикстуру ингредиентов
      из csv/json файла в бд.
+
+    Файл читается и пишется пачками по --batch-size строк (json -
+    частями, без загрузки целиком), уже существующие ингредиенты
+    пропускаются, поэтому команду можно запускать повторно.
     """
     help = 'Import .csv file to the database.'
 
-    def upload_to_db(self, path_to_file):
-        """Чтение csv файлов и последующая загрузка в бд."""
+    def read_rows(self, path_to_file):
+        """Построчное чтение csv/json файла."""
         with open(path_to_file, encoding='utf-8', mode='r') as file:
-            data_for_db = []
-            if path_to_file[-4:] == '.csv':
-                reader = csv.reader(file)
-                for name, measurement_unit in reader:
-                    data_for_db.append(
-                        {
-                            'name': name,
-                            'measurement_unit': measurement_unit,
-                        }
+            if path_to_file.endswith('.csv'):
+                for name, measurement_unit in csv.reader(file):
+                    yield name.strip(), measurement_unit.strip()
+            elif path_to_file.endswith('.json'):
+                for row in iter_json_array(file):
+                    yield (
+                        row['name'].strip(),
+                        row['measurement_unit'].strip()
                     )
-            elif path_to_file[-5:] == '.json':
-                data_for_db = json.load(file)
 
-            try:
-                for row_for_db in data_for_db:
-                    Ingredient.objects.create(**row_for_db)
-                self.stdout.write(f'{path_to_file} is uploaded.')
-            except IntegrityError as e:
-                self.stdout.write(
-                    f'in {path_to_file} | {str(e)} | {row_for_db}'
+    def upload_batch(self, batch, update_units, counts):
+        """Загрузка одной пачки строк в бд."""
+        existing = defaultdict(set)
+        for pk, name, measurement_unit in Ingredient.objects.filter(
+            name__in={name for name, _ in batch}
+        ).values_list('id', 'name', 'measurement_unit'):
+            existing[name].add((pk, measurement_unit))
+
+        units_in_batch = defaultdict(set)
+        for name, measurement_unit in batch:
+            units_in_batch[name].add(measurement_unit)
+
+        new_ingredients = []
+        changed_units = []
+        for name, measurement_unit in batch:
+            known_units = {unit for _, unit in existing[name]}
+            if measurement_unit in known_units:
+                counts['skipped'] += 1
+            elif (not update_units or not known_units
+                  or len(units_in_batch[name]) > 1):
+                new_ingredients.append(
+                    Ingredient(name=name, measurement_unit=measurement_unit)
                 )
+                counts['inserted'] += 1
+            elif len(existing[name]) == 1:
+                (pk, _), = existing[name]
+                changed_units.append(
+                    Ingredient(pk=pk, measurement_unit=measurement_unit)
+                )
+                counts['updated'] += 1
+            else:
+                counts['conflicting'] += 1
+                self.stdout.write(self.style.WARNING(
+                    f'{name} ({measurement_unit}): unit is ambiguous, '
+                    f'known units are {", ".join(sorted(known_units))}.'
+                ))
+        Ingredient.objects.bulk_create(
+            new_ingredients,
+            ignore_conflicts=True
+        )
+        Ingredient.objects.bulk_update(changed_units, ['measurement_unit'])
+
+    def upload_to_db(self, path_to_file, batch_size, update_units, dry_run):
+        """Чтение csv/json файлов и последующая загрузка в бд."""
+        counts = defaultdict(int)
+        rows = self.read_rows(path_to_file)
+        processed = 0
+        with transaction.atomic():
+            while True:
+                rows_in_batch = list(islice(rows, batch_size))
+                if not rows_in_batch:
+                    break
+                batch = list(dict.fromkeys(rows_in_batch))
+                counts['skipped'] += len(rows_in_batch) - len(batch)
+                self.upload_batch(batch, update_units, counts)
+                processed += len(rows_in_batch)
+                self.stdout.write(f'{processed} rows processed.')
+            if dry_run:
+                transaction.set_rollback(True)
+        if not dry_run and (counts['inserted'] or counts['updated']):
+            bump_data_version()
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{path_to_file} is {"checked" if dry_run else "uploaded"}: '
+            f'inserted {counts["inserted"]}, '
+            f'updated {counts["updated"]}, '
+            f'skipped {counts["skipped"]}, '
+            f'conflicting {counts["conflicting"]}.'
+        ))
 
     def add_arguments(self, parser):
         parser.add_argument('directory', type=str, help='/path/to/file')
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=BATCH_SIZE,
+            help='Number of rows written per query.'
+        )
+        parser.add_argument(
+            '--update-units',
+            action='store_true',
+            help='Replace the unit of an ingredient known under one unit '
+                 'instead of adding the ingredient with a new unit.'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Report what would change without writing to the database.'
+        )
 
     def handle(self, *args, **options):
         directory = options['directory']
@@ -52,4 +175,9 @@ class Command(BaseCommand):
             )
             return
 
-        self.upload_to_db(directory)
+        self.upload_to_db(
+            directory,
+            options['batch_size'],
+            options['update_units'],
+            options['dry_run']
+        )
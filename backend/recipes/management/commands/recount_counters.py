@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from recipes.counters import find_drift, recount
+
+
+class Command(BaseCommand):
+    """
+    Команда пересчитывающая счётчики избранного, корзин, рецептов
+    и подписчиков по данным в бд.
+    """
+    help = 'Recompute denormalized counters or check them for drift.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Only report drifted counters, exit with an error if any.'
+        )
+
+    def handle(self, *args, **options):
+        drift = find_drift()
+        for model, field, pk, stored, actual in drift:
+            self.stdout.write(self.style.WARNING(
+                f'{model.__name__} {pk}: {field} is {stored}, '
+                f'actual {actual}.'
+            ))
+        if options['check']:
+            if drift:
+                raise CommandError(f'{len(drift)} counters drifted.')
+            self.stdout.write(self.style.SUCCESS('Counters are consistent.'))
+            return
+
+        with transaction.atomic():
+            updated = recount()
+        self.stdout.write(self.style.SUCCESS(
+            f'Counters recomputed for {updated} rows, '
+            f'{len(drift)} were drifted.'
+        ))
@@ -0,0 +1,92 @@
+# Generated by Django 3.2.3 on 2026-10-18 01:54
+
+import re
+
+import django.contrib.postgres.search
+from django.db import migrations, models
+import django.db.models.deletion
+
+CREATE_SEARCH_VECTOR_SQL = """
+CREATE FUNCTION recipes_recipe_search_vector_update() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector :=
+        setweight(to_tsvector('russian', coalesce(NEW.name, '')), 'A') ||
+        setweight(to_tsvector('russian', coalesce(NEW.text, '')), 'B');
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER recipes_recipe_search_vector_trigger
+    BEFORE INSERT OR UPDATE OF name, text ON recipes_recipe
+    FOR EACH ROW EXECUTE PROCEDURE recipes_recipe_search_vector_update();
+
+UPDATE recipes_recipe SET name = name;
+
+CREATE INDEX recipes_recipe_search_vector_gin
+    ON recipes_recipe USING gin (search_vector);
+"""
+
+DROP_SEARCH_VECTOR_SQL = """
+DROP INDEX IF EXISTS recipes_recipe_search_vector_gin;
+DROP TRIGGER IF EXISTS recipes_recipe_search_vector_trigger ON recipes_recipe;
+DROP FUNCTION IF EXISTS recipes_recipe_search_vector_update();
+"""
+
+
+def split_words(text):
+    """
+    Копия recipes.search.split_words на момент миграции: миграция
+    не должна зависеть от кода приложения, который будет меняться.
+    """
+    text = text.casefold().replace('ё', 'е').strip()
+    return list(dict.fromkeys(word[:64] for word in re.findall(r'\w+', text)))
+
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(CREATE_SEARCH_VECTOR_SQL)
+        return
+    Recipe = apps.get_model('recipes', 'Recipe')
+    SearchWord = apps.get_model('recipes', 'SearchWord')
+    SearchWord.objects.bulk_create(
+        SearchWord(recipe_id=pk, word=word)
+        for pk, name, text in Recipe.objects.values_list('id', 'name', 'text')
+        for word in split_words(f'{name} {text}')
+    )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(DROP_SEARCH_VECTOR_SQL)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0003_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True, verbose_name='Поисковый вектор'),
+        ),
+        migrations.CreateModel(
+            name='SearchWord',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('word', models.CharField(max_length=64, verbose_name='Слово')),
+                ('recipe', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_words', to='recipes.recipe', verbose_name='Рецепт')),
+            ],
+            options={
+                'verbose_name': 'Слово для поиска',
+                'verbose_name_plural': 'Слова для поиска',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='searchword',
+            index=models.Index(fields=['word', 'recipe'], name='recipes_sea_word_bc61d4_idx'),
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 3.2.3 on 2026-10-18 03:11
+
+from django.db import migrations, models
+from django.db.models import Exists, OuterRef
+
+
+def mark_not_fanned_out(apps, schema_editor):
+    """
+    Рецепт считается разложенным, только если он есть в лентах всех
+    текущих подписчиков автора, остальные попадают в ленты при чтении.
+    """
+    Recipe = apps.get_model('recipes', 'Recipe')
+    FeedEntry = apps.get_model('recipes', 'FeedEntry')
+    Subscribers = apps.get_model('users', 'Subscribers')
+    missing = Subscribers.objects.filter(
+        author=OuterRef('author')
+    ).filter(
+        ~Exists(FeedEntry.objects.filter(
+            user=OuterRef('user'),
+            recipe=OuterRef(OuterRef('pk'))
+        ))
+    )
+    Recipe.objects.filter(Exists(missing)).update(fanned_out=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0006_feed'),
+        ('users', '0002_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='fanned_out',
+            field=models.BooleanField(default=True, editable=False, verbose_name='Разложен по лентам'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(condition=models.Q(('fanned_out', False)), fields=['author'], name='recipes_recipe_not_fanned_out'),
+        ),
+        migrations.RunPython(
+            mark_not_fanned_out, migrations.RunPython.noop
+        ),
+    ]
@@ -1,3 +1,4 @@
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
 
 from users.models import User
@@ -80,16 +81,62 @@ class Recipe(models.Model):
     )
     cooking_time = models.IntegerField('Время приготовления')
     text = models.TextField('Рецепт')
+    favorites_count = models.PositiveIntegerField(
+        'Количество в избранных',
+        default=0,
+        editable=False
+    )
+    in_carts_count = models.PositiveIntegerField(
+        'Количество в корзинах',
+        default=0,
+        editable=False
+    )
+    search_vector = SearchVectorField(
+        'Поисковый вектор',
+        null=True,
+        editable=False
+    )
+    fanned_out = models.BooleanField(
+        'Разложен по лентам',
+        default=True,
+        editable=False
+    )
 
     class Meta:
         ordering = ('name',)
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
+        indexes = [
+            models.Index(
+                fields=['author'],
+                name='recipes_recipe_not_fanned_out',
+                condition=models.Q(fanned_out=False)
+            ),
+        ]
 
     def __str__(self):
         return self.name
 
 
+class SearchWord(models.Model):
+    """
+    Слова из названия и описания рецепта для поиска на бд без
+    полнотекстового поиска (на Postgres используется search_vector).
+    """
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='search_words',
+        verbose_name='Рецепт'
+    )
+    word = models.CharField('Слово', max_length=SHORT_LENGTH)
+
+    class Meta:
+        verbose_name = 'Слово для поиска'
+        verbose_name_plural = 'Слова для поиска'
+        indexes = [models.Index(fields=['word', 'recipe'])]
+
+
 class RecipeIngredient(models.Model):
     recipe = models.ForeignKey(
         Recipe,
@@ -129,6 +176,7 @@ class RecipeTag(models.Model):
         verbose_name = 'Рецепт - Тег'
         verbose_name_plural = 'Рецепт - Тег'
         unique_together = [['recipe', 'tag']]
+        indexes = [models.Index(fields=['tag', 'recipe'])]
 
 
 class Favorite(models.Model):
@@ -167,3 +215,32 @@ class ShoppingCart(models.Model):
         verbose_name = 'Корзина'
         verbose_name_plural = 'Корзины'
         unique_together = [['recipe', 'user']]
+        indexes = [models.Index(fields=['user', 'recipe'])]
+
+
+class FeedEntry(models.Model):
+    """Запись ленты: рецепт автора, на которого подписан пользователь."""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='feed_entries',
+        verbose_name='Пользователь'
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='feed_entries',
+        verbose_name='Рецепт'
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Автор'
+    )
+
+    class Meta:
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Записи ленты'
+        unique_together = [['user', 'recipe']]
+        indexes = [models.Index(fields=['user', 'author'])]
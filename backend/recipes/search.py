@@ -0,0 +1,134 @@
+import re
+import threading
+from bisect import bisect_left
+
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db import connections
+from django.db.models import F, FloatField, Value
+
+from .models import SHORT_LENGTH, Ingredient, SearchWord
+from .versions import get_data_version
+
+SEARCH_CONFIG: str = 'russian'
+
+
+def normalize(text: str) -> str:
+    """Приводит строку к виду для поиска: без регистра, ё равно е."""
+    return text.casefold().replace('ё', 'е').strip()
+
+
+def split_words(text: str) -> list:
+    """Нормализованные слова строки без повторов."""
+    return list(dict.fromkeys(
+        word[:SHORT_LENGTH] for word in re.findall(r'\w+', normalize(text))
+    ))
+
+
+def index_recipe_words(recipe):
+    """Пересобирает слова рецепта для поиска без search_vector."""
+    SearchWord.objects.filter(recipe=recipe).delete()
+    SearchWord.objects.bulk_create(
+        SearchWord(recipe=recipe, word=word)
+        for word in split_words(f'{recipe.name} {recipe.text}')
+    )
+
+
+def search_recipes(queryset, query):
+    """
+    Рецепты, подходящие под поисковый запрос, с оценкой search_rank.
+
+    На Postgres используется полнотекстовый поиск по search_vector
+    (GIN индекс, вектор обновляет триггер). На других бд каждое слово
+    запроса должно быть началом одного из слов рецепта, слова ищутся
+    по индексу SearchWord, оценка у всех рецептов одинаковая.
+    """
+    if connections[queryset.db].vendor == 'postgresql':
+        search_query = SearchQuery(
+            query,
+            config=SEARCH_CONFIG,
+            search_type='websearch'
+        )
+        return queryset.filter(search_vector=search_query).annotate(
+            search_rank=SearchRank(F('search_vector'), search_query)
+        )
+    for word in split_words(query):
+        queryset = queryset.filter(pk__in=SearchWord.objects.filter(
+            word__gte=word,
+            word__lt=word + '\uffff'
+        ).values('recipe'))
+    return queryset.annotate(
+        search_rank=Value(0.0, output_field=FloatField())
+    )
+
+
+class IngredientIndex:
+    """
+    Индекс ингредиентов в памяти процесса для автодополнения по названию.
+
+    Хранит отсортированный массив нормализованных названий, префикс ищется
+    двоичным поиском. Индекс запоминает версию справочных данных, с которой
+    построен, и перестраивается, когда версия в кэше Django меняется, в том
+    числе после изменений в других процессах. Поэтому ответ, закэшированный
+    под новой версией, не строится из старого индекса.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = ([], [])
+        self._version = None
+
+    def invalidate(self):
+        self._version = None
+
+    def build(self, version):
+        """
+        Версия передаётся прочитанной до выборки ингредиентов: если данные
+        изменятся во время построения, индекс будет перестроен ещё раз.
+        """
+        rows = sorted(
+            (normalize(name), name, pk, measurement_unit)
+            for pk, name, measurement_unit in Ingredient.objects.values_list(
+                'id', 'name', 'measurement_unit'
+            )
+        )
+        self._entries = ([row[0] for row in rows], rows)
+        self._version = version
+
+    def ensure_built(self):
+        version = get_data_version()
+        if self._version == version:
+            return
+        with self._lock:
+            if self._version != version:
+                self.build(version)
+
+    def search(self, query):
+        """
+        Ингредиенты, подходящие под запрос: сначала точные совпадения,
+        затем начинающиеся с запроса, затем содержащие его.
+        """
+        self.ensure_built()
+        keys, rows = self._entries
+        query = normalize(query)
+        if not query:
+            return [self.to_dict(row) for row in rows]
+        start = bisect_left(keys, query)
+        end = bisect_left(keys, query + '\uffff', start)
+        exact = [row for row in rows[start:end] if row[0] == query]
+        prefix = [row for row in rows[start:end] if row[0] != query]
+        contains = [
+            row for row in rows[:start] + rows[end:] if query in row[0]
+        ]
+        return [self.to_dict(row) for row in exact + prefix + contains]
+
+    @staticmethod
+    def to_dict(row):
+        _, name, pk, measurement_unit = row
+        return {
+            'id': pk,
+            'name': name,
+            'measurement_unit': measurement_unit,
+        }
+
+
+ingredient_index = IngredientIndex()
@@ -0,0 +1,397 @@
+import io
+import math
+import random
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from functools import lru_cache
+from typing import NamedTuple
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.management.color import no_style
+from django.db import connection, connections, transaction
+from django.utils import timezone
+
+from users.models import Subscribers, User
+
+from .counters import recount
+from .models import (Favorite, FeedEntry, Ingredient, Recipe, RecipeIngredient,
+                     RecipeTag, SearchWord, ShoppingCart, Tag)
+from .search import split_words
+
+BATCH_SIZE: int = 5000
+CHUNK_SIZE: int = 5000
+PASSWORD: str = 'seed-password'
+
+TAGS = (
+    ('Завтрак', '#E26C2D', 'breakfast'),
+    ('Обед', '#49B64E', 'lunch'),
+    ('Ужин', '#8775D2', 'dinner'),
+    ('Десерт', '#F2C94C', 'dessert'),
+    ('Выпечка', '#EB5757', 'bakery'),
+    ('Постное', '#2D9CDB', 'lenten'),
+)
+
+WORDS = (
+    'борщ', 'суп', 'салат', 'пирог', 'каша', 'котлеты', 'плов', 'блины',
+    'оладьи', 'запеканка', 'рагу', 'соус', 'паста', 'омлет', 'торт',
+    'курица', 'говядина', 'свинина', 'рыба', 'грибы', 'картофель',
+    'капуста', 'морковь', 'лук', 'чеснок', 'томаты', 'сыр', 'творог',
+    'яблоки', 'мёд', 'орехи', 'рис', 'гречка', 'тыква', 'свёкла',
+    'домашний', 'быстрый', 'летний', 'острый', 'сливочный', 'печёный',
+    'жареный', 'тушёный', 'бабушкин', 'праздничный', 'лёгкий',
+)
+
+UNITS = ('г', 'кг', 'мл', 'л', 'шт', 'ст. л.', 'ч. л.', 'по вкусу')
+
+USER_FIELDS = (
+    'id', 'password', 'is_superuser', 'username', 'first_name', 'last_name',
+    'email', 'is_staff', 'is_active', 'date_joined', 'recipes_count',
+    'subscribers_count',
+)
+RECIPE_FIELDS = (
+    'id', 'author_id', 'name', 'text', 'cooking_time', 'favorites_count',
+    'in_carts_count', 'fanned_out',
+)
+
+
+class Plan(NamedTuple):
+    """
+    Параметры набора данных. id пользователей и рецептов задаются явно,
+    начиная с user_base и recipe_base, поэтому любая часть набора
+    генерируется независимо от остальных и одинаково при любом числе
+    процессов.
+    """
+
+    seed: int
+    users: int
+    recipes: int
+    favorites: int
+    carts: int
+    subscriptions: int
+    exponent: float
+    user_base: int
+    recipe_base: int
+    tag_ids: tuple
+    ingredient_ids: tuple
+    password: str
+    joined: object
+
+
+def zipf_rank(rng, size, exponent):
+    """
+    Номер от 0 до size - 1, k-й выпадает примерно в k ** exponent раз реже
+    нулевого. Обратная функция к непрерывному приближению распределения
+    Ципфа, память не зависит от size.
+    """
+    if exponent == 1:
+        rank = math.exp(rng.random() * math.log(size + 1))
+    else:
+        power = 1 - exponent
+        total = ((size + 1) ** power - 1) / power
+        rank = (rng.random() * total * power + 1) ** (1 / power)
+    return min(int(rank) - 1, size - 1)
+
+
+@lru_cache(maxsize=None)
+def coprime_stride(size):
+    stride = int(size * 0.618) + 1
+    while math.gcd(stride, size) != 1:
+        stride += 1
+    return stride
+
+
+def popular(rank, size, base):
+    """
+    id объекта с данным местом по популярности. Популярные объекты
+    разбросаны по всему диапазону id, а не идут подряд.
+    """
+    return base + rank * coprime_stride(size) % size
+
+
+def chunk_random(plan, table, index):
+    return random.Random(f'{plan.seed}-{table}-{index}')
+
+
+def sentence(rng, low, high):
+    return ' '.join(rng.choices(WORDS, k=rng.randint(low, high)))
+
+
+def user_rows(plan, start, stop):
+    for user_id in range(plan.user_base + start, plan.user_base + stop):
+        yield {User: [(
+            user_id, plan.password, False, f'seed-{user_id}', 'Имя',
+            'Фамилия', f'seed-{user_id}@example.com', False, True,
+            plan.joined, 0, 0,
+        )]}
+
+
+def recipe_rows(plan, start, stop, search_words):
+    rng = chunk_random(plan, 'recipes', start)
+    for number in range(start, stop):
+        recipe_id = plan.recipe_base + number
+        name = sentence(rng, 2, 3).capitalize()
+        text = sentence(rng, 10, 30)
+        author_id = popular(
+            zipf_rank(rng, plan.users, plan.exponent),
+            plan.users,
+            plan.user_base
+        )
+        rows = {
+            Recipe: [(recipe_id, author_id, name, text,
+                      rng.randint(1, 180), 0, 0, True)],
+            RecipeTag: [
+                (recipe_id, tag_id)
+                for tag_id in rng.sample(plan.tag_ids, rng.randint(1, 3))
+            ],
+            RecipeIngredient: [
+                (recipe_id, ingredient_id, rng.randint(1, 500))
+                for ingredient_id in rng.sample(
+                    plan.ingredient_ids,
+                    min(rng.randint(3, 12), len(plan.ingredient_ids))
+                )
+            ],
+        }
+        if search_words:
+            rows[SearchWord] = [
+                (recipe_id, word) for word in split_words(f'{name} {text}')
+            ]
+        yield rows
+
+
+def pick(rng, plan, mean, size, base, exclude=None):
+    """Около mean разных популярных объектов для одного пользователя."""
+    wanted = min(rng.randint(0, 2 * mean), size)
+    return {
+        popular(zipf_rank(rng, size, plan.exponent), size, base)
+        for _ in range(wanted)
+    } - {exclude}
+
+
+def relation_rows(plan, start, stop):
+    rng = chunk_random(plan, 'relations', start)
+    for number in range(start, stop):
+        user_id = plan.user_base + number
+        yield {
+            Favorite: [
+                (user_id, recipe_id) for recipe_id in sorted(pick(
+                    rng, plan, plan.favorites, plan.recipes, plan.recipe_base
+                ))
+            ],
+            ShoppingCart: [
+                (user_id, recipe_id) for recipe_id in sorted(pick(
+                    rng, plan, plan.carts, plan.recipes, plan.recipe_base
+                ))
+            ],
+            Subscribers: [
+                (user_id, author_id) for author_id in sorted(pick(
+                    rng, plan, plan.subscriptions, plan.users,
+                    plan.user_base, exclude=user_id
+                ))
+            ],
+        }
+
+
+FIELDS = {
+    User: USER_FIELDS,
+    Recipe: RECIPE_FIELDS,
+    RecipeTag: ('recipe_id', 'tag_id'),
+    RecipeIngredient: ('recipe_id', 'ingredient_id', 'amount'),
+    SearchWord: ('recipe_id', 'word'),
+    Favorite: ('user_id', 'recipe_id'),
+    ShoppingCart: ('user_id', 'recipe_id'),
+    Subscribers: ('user_id', 'author_id'),
+    FeedEntry: ('user_id', 'recipe_id', 'author_id'),
+}
+
+
+def copy_value(value):
+    if value is None:
+        return '\\N'
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    if not isinstance(value, str):
+        return str(value)
+    return (
+        value.replace('\\', '\\\\').replace('\t', '\\t')
+        .replace('\n', '\\n').replace('\r', '\\r')
+    )
+
+
+def table_and_columns(model):
+    columns = ', '.join(
+        connection.ops.quote_name(model._meta.get_field(name).column)
+        for name in FIELDS[model]
+    )
+    return connection.ops.quote_name(model._meta.db_table), columns
+
+
+def copy_rows(model, rows):
+    """Запись строк одним COPY ... FROM STDIN (только Postgres)."""
+    buffer = io.StringIO()
+    for row in rows:
+        buffer.write('\t'.join(map(copy_value, row)))
+        buffer.write('\n')
+    buffer.seek(0)
+    table, columns = table_and_columns(model)
+    with connection.cursor() as cursor:
+        cursor.copy_expert(f'COPY {table} ({columns}) FROM STDIN', buffer)
+
+
+def insert_rows(model, rows):
+    """
+    Запись строк пачками INSERT через executemany для бд без COPY.
+    bulk_create здесь упирается в создание объектов моделей.
+    """
+    table, columns = table_and_columns(model)
+    placeholders = ', '.join(['%s'] * len(FIELDS[model]))
+    with connection.cursor() as cursor:
+        for start in range(0, len(rows), BATCH_SIZE):
+            cursor.executemany(
+                f'INSERT INTO {table} ({columns}) VALUES ({placeholders})',
+                rows[start:start + BATCH_SIZE]
+            )
+
+
+def write(chunks):
+    """
+    Записывает строки части набора в одной транзакции, возвращает
+    их число.
+    """
+    tables = {}
+    for rows in chunks:
+        for model, model_rows in rows.items():
+            tables.setdefault(model, []).extend(model_rows)
+    writer = copy_rows if connection.vendor == 'postgresql' else insert_rows
+    with transaction.atomic():
+        for model in FIELDS:
+            if tables.get(model):
+                writer(model, tables[model])
+    return sum(len(rows) for rows in tables.values())
+
+
+def run_task(plan, kind, start, stop):
+    if kind == 'users':
+        return write(user_rows(plan, start, stop))
+    if kind == 'recipes':
+        return write(recipe_rows(
+            plan, start, stop, connection.vendor != 'postgresql'
+        ))
+    return write(relation_rows(plan, start, stop))
+
+
+def make_plan(seed, users, recipes, favorites, carts, subscriptions,
+              exponent=1.1, ingredients=2000):
+    """
+    Готовит план: находит свободные id, создаёт теги и ингредиенты,
+    если их ещё нет.
+    """
+    if not Tag.objects.exists():
+        Tag.objects.bulk_create(
+            Tag(name=name, color=color, slug=slug)
+            for name, color, slug in TAGS
+        )
+    if not Ingredient.objects.exists():
+        rng = random.Random(f'{seed}-ingredients')
+        Ingredient.objects.bulk_create(
+            (
+                Ingredient(
+                    name=f'{rng.choice(WORDS)} {number}',
+                    measurement_unit=rng.choice(UNITS)
+                )
+                for number in range(ingredients)
+            ),
+            batch_size=BATCH_SIZE
+        )
+    last_user = User.objects.order_by('-id').values_list('id', flat=True)
+    last_recipe = Recipe.objects.order_by('-id').values_list('id', flat=True)
+    return Plan(
+        seed=seed,
+        users=users,
+        recipes=recipes,
+        favorites=favorites,
+        carts=carts,
+        subscriptions=subscriptions,
+        exponent=exponent,
+        user_base=(last_user.first() or 0) + 1,
+        recipe_base=(last_recipe.first() or 0) + 1,
+        tag_ids=tuple(Tag.objects.order_by('id').values_list(
+            'id', flat=True
+        )),
+        ingredient_ids=tuple(Ingredient.objects.order_by('id').values_list(
+            'id', flat=True
+        )),
+        password=make_password(PASSWORD),
+        joined=connection.ops.adapt_datetimefield_value(timezone.now()),
+    )
+
+
+def split(kind, size):
+    return [
+        (kind, start, min(start + CHUNK_SIZE, size))
+        for start in range(0, size, CHUNK_SIZE)
+    ]
+
+
+def run_phase(tasks, workers, progress):
+    if workers <= 1:
+        for task in tasks:
+            progress(*task[1:], run_task(*task))
+        return
+    # Процессы наследуют открытые соединения при fork, каждый
+    # должен открыть своё.
+    connections.close_all()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            executor.submit(run_task, *task): task for task in tasks
+        }
+        for future in as_completed(futures):
+            progress(*futures[future][1:], future.result())
+
+
+def seed(plan, workers=1, progress=None):
+    """
+    Записывает набор данных: пользователей, затем рецепты с тегами и
+    ингредиентами, затем избранное, корзины и подписки. Этап делится
+    на части по CHUNK_SIZE строк, части пишутся параллельно в workers
+    процессах, у каждой свой генератор случайных чисел. После записи
+    обновляются последовательности id, счётчики и ленты.
+    """
+    progress = progress or (lambda kind, start, stop, rows: None)
+    phases = (
+        split('users', plan.users),
+        split('recipes', plan.recipes),
+        split('relations', plan.users),
+    )
+    for tasks in phases:
+        run_phase([(plan, *task) for task in tasks], workers, progress)
+
+    with connection.cursor() as cursor:
+        for sql in connection.ops.sequence_reset_sql(
+            no_style(), [User, Recipe]
+        ):
+            cursor.execute(sql)
+    recount()
+    progress('feed', 0, plan.users, fill_feed(plan))
+
+
+def fill_feed(plan):
+    """
+    Ленты новых пользователей одним INSERT ... SELECT: рецепты авторов,
+    на которых они подписаны, кроме популярных (см. feed.py). Рецепты
+    популярных авторов помечаются fanned_out=False. Возвращает число
+    записей.
+    """
+    Recipe.objects.filter(
+        id__gte=plan.recipe_base,
+        author__subscribers_count__gt=settings.FEED_FANOUT_LIMIT
+    ).update(fanned_out=False)
+    subscriptions = Subscribers.objects.filter(
+        user_id__gte=plan.user_base,
+        author__subscribers_count__lte=settings.FEED_FANOUT_LIMIT,
+        author__recipes__isnull=False
+    ).values_list('user_id', 'author__recipes__id', 'author_id')
+    sql, params = subscriptions.query.sql_with_params()
+    table, columns = table_and_columns(FeedEntry)
+    with connection.cursor() as cursor:
+        cursor.execute(f'INSERT INTO {table} ({columns}) {sql}', params)
+        return cursor.rowcount
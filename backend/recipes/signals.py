@@ -0,0 +1,84 @@
+from django.db import connection
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from users.models import Subscribers, User
+
+from .counters import change_counter
+from .feed import backfill
+from .models import Favorite, Ingredient, Recipe, ShoppingCart
+from .search import index_recipe_words, ingredient_index
+
+# Удаление избранного, корзины и подписок сигналов не обрабатывает:
+# любой получатель post_delete отключает быстрое каскадное удаление,
+# и удаление рецепта или пользователя стоило бы запроса на каждую
+# связь. Счётчики и ленту при удалении меняют remove_link(s) в api,
+# админка и decrease_counters_of_followed, после удаления через ORM
+# счётчики восстанавливает recount_counters.
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def invalidate_ingredient_index(**kwargs):
+    ingredient_index.invalidate()
+
+
+@receiver(post_save, sender=Recipe)
+def update_search_words(instance, **kwargs):
+    if connection.vendor != 'postgresql':
+        index_recipe_words(instance)
+
+
+@receiver(post_save, sender=Favorite)
+def increase_favorites_count(instance, created, **kwargs):
+    if created:
+        change_counter(Recipe, instance.recipe_id, 'favorites_count', 1)
+
+
+@receiver(post_save, sender=ShoppingCart)
+def increase_in_carts_count(instance, created, **kwargs):
+    if created:
+        change_counter(Recipe, instance.recipe_id, 'in_carts_count', 1)
+
+
+@receiver(post_save, sender=Recipe)
+def increase_recipes_count(instance, created, **kwargs):
+    if created:
+        change_counter(User, instance.author_id, 'recipes_count', 1)
+
+
+@receiver(post_delete, sender=Recipe)
+def decrease_recipes_count(instance, **kwargs):
+    change_counter(User, instance.author_id, 'recipes_count', -1)
+
+
+@receiver(post_save, sender=Subscribers)
+def increase_subscribers_count(instance, created, **kwargs):
+    if created:
+        change_counter(User, instance.author_id, 'subscribers_count', 1)
+
+
+@receiver(post_save, sender=Subscribers)
+def backfill_feed(instance, created, **kwargs):
+    if created:
+        backfill(instance.user_id, instance.author_id)
+
+
+@receiver(pre_delete, sender=User)
+def decrease_counters_of_followed(instance, **kwargs):
+    """
+    Избранное, корзина и подписки пользователя удаляются каскадом без
+    сигналов, счётчики рецептов и авторов, которые остаются,
+    уменьшаются здесь - тремя запросами при любом числе связей.
+    """
+    for model, field in (
+        (Favorite, 'favorites_count'),
+        (ShoppingCart, 'in_carts_count'),
+    ):
+        Recipe.objects.filter(
+            pk__in=model.objects.filter(user=instance).values('recipe')
+        ).update(**{field: F(field) - 1})
+    User.objects.filter(
+        pk__in=Subscribers.objects.filter(user=instance).values('author')
+    ).update(subscribers_count=F('subscribers_count') - 1)
@@ -0,0 +1,36 @@
+import time
+
+from django.core.cache import cache
+
+DATA_VERSION_KEY: str = 'reference-data-version'
+
+
+def get_generation(key, backend=cache, timeout=None):
+    """
+    Счётчик поколения данных, входящий в ключи кэша.
+
+    Начальное значение берётся из текущего времени, чтобы после очистки
+    кэша или истечения timeout счётчик не совпал с одним из уже
+    использованных значений.
+    """
+    version = backend.get(key)
+    if version is not None:
+        return version
+    backend.add(key, time.time_ns(), timeout=timeout)
+    return backend.get(key)
+
+
+def bump_generation(key, backend=cache, timeout=None):
+    try:
+        backend.incr(key)
+    except ValueError:
+        backend.add(key, time.time_ns(), timeout=timeout)
+
+
+def get_data_version():
+    """Версия справочных данных (теги и ингредиенты)."""
+    return get_generation(DATA_VERSION_KEY)
+
+
+def bump_data_version():
+    bump_generation(DATA_VERSION_KEY)
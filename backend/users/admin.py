@@ -1,5 +1,8 @@
 from django.contrib import admin
 
+from recipes.admin import LinkAdmin
+from recipes.feed import backfill, prune
+
 from .models import Subscribers, User
 
 
@@ -17,11 +20,33 @@ class UserAdmin(admin.ModelAdmin):
     list_filter = ('is_superuser', 'is_staff', 'email', 'username',)
 
 
-class SubscribersAdmin(admin.ModelAdmin):
+class SubscribersAdmin(LinkAdmin):
+    """Подписки, кроме счётчика обновляет и ленту подписчика."""
 
+    target = 'author'
+    counter = (User, 'subscribers_count')
     list_display = ('user', 'author')
     search_fields = ('user__username', 'author__username')
 
+    def save_model(self, request, obj, form, change):
+        old = self.model.objects.filter(pk=obj.pk).values_list(
+            'user_id', 'author_id'
+        ).first()
+        super().save_model(request, obj, form, change)
+        if old and old != (obj.user_id, obj.author_id):
+            prune(*old)
+            backfill(obj.user_id, obj.author_id)
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        prune(obj.user_id, obj.author_id)
+
+    def delete_queryset(self, request, queryset):
+        pairs = list(queryset.values_list('user_id', 'author_id'))
+        super().delete_queryset(request, queryset)
+        for user_id, author_id in pairs:
+            prune(user_id, author_id)
+
 
 admin.site.register(Subscribers, SubscribersAdmin)
 admin.site.register(User, UserAdmin)
@@ -16,6 +16,16 @@ class User(AbstractUser):
     email = models.EmailField('Почта', unique=True, max_length=254)
     first_name = models.CharField('Имя', max_length=LENGTH)
     last_name = models.CharField('Фамилия', max_length=LENGTH)
+    recipes_count = models.PositiveIntegerField(
+        'Количество рецептов',
+        default=0,
+        editable=False
+    )
+    subscribers_count = models.PositiveIntegerField(
+        'Количество подписчиков',
+        default=0,
+        editable=False
+    )
 
     class Meta:
         ordering = ('id',)